@@ -1,31 +1,71 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timedelta, timezone
 from functools import lru_cache
-from typing import List, Optional
+from time import monotonic, time
+from typing import Any, Dict, List, Optional, Tuple
 from uuid import UUID, uuid4
 
 import uvicorn
-from fastapi import Depends, FastAPI, HTTPException, Path
-from fastapi.responses import RedirectResponse
+from fastapi import (
+    APIRouter,
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+)
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import UUID4, EmailStr
+from pydantic.datetime_parse import parse_datetime
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from . import config
+from . import async_crud, config
+from .cache import ContactCache, SharedResponseCache
 from .crud import (
-    create_contact,
+    contact_content_hash,
+    contact_document_updated,
+    create_contacts,
     get_contact_by_email_id,
-    get_contacts_by_any_id,
+    get_contact_documents_by_any_id,
+    get_contact_group,
+    get_contact_updated,
+    get_contacts_by_email_ids,
+    get_contacts_updated_since,
+    get_content_hashes,
     get_email_by_email_id,
+    get_identities_by_any_id,
+    get_identity_by_email_id,
+    iter_contacts,
+    update_contact,
+    update_newsletter_subscriptions,
 )
-from .database import get_db_engine
+from .database import get_async_db_pool, get_db_engine, pool_metrics
+from .metrics import MetricsMiddleware, get_registry
+from .models import AmoAccount, Email, FirefoxAccount, VpnWaitlist
+from .responses import FastJSONResponse, dump_json
 from .schemas import (
     AddOnsSchema,
     BadRequestResponse,
+    ContactBatchRequest,
+    ContactBatchResponse,
+    ContactBulkRequest,
+    ContactBulkResponse,
+    ContactBulkResult,
     ContactInSchema,
+    ContactPatchSchema,
     ContactSchema,
+    ContactUpdatesResponse,
     CTMSResponse,
     EmailSchema,
     FirefoxAccountsSchema,
     IdentityResponse,
+    NewsletterBulkRequest,
+    NewsletterBulkResponse,
     NewsletterSchema,
     NotFoundResponse,
     VpnWaitlistSchema,
@@ -35,8 +75,19 @@ app = FastAPI(
     title="ConTact Management System (CTMS)",
     description="CTMS API (work in progress)",
     version="0.5.0",
+    default_response_class=FastJSONResponse,
 )
+app.add_middleware(MetricsMiddleware)
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
 SessionLocal = None
+ReplicaSessionLocal = None
+AsyncPool = None
+contact_cache = None
+shared_cache = None
+
+# Async versions of endpoints, used instead of the sync versions when
+# CTMS_USE_ASYNC_DB is set. See the end of this file.
+async_router = APIRouter()
 
 
 @lru_cache()
@@ -45,9 +96,53 @@ def get_settings():
 
 
 @app.on_event("startup")
-def startup_event():
-    global SessionLocal
-    engine, SessionLocal = get_db_engine(get_settings())
+async def startup_event():
+    global SessionLocal, ReplicaSessionLocal, AsyncPool, contact_cache, shared_cache
+    settings = get_settings()
+    if settings.use_contact_cache:
+        contact_cache = ContactCache(
+            settings.contact_cache_size,
+            settings.contact_cache_ttl,
+            hold=settings.contact_cache_hold,
+        )
+    if settings.shared_cache_path:
+        shared_cache = SharedResponseCache(
+            settings.shared_cache_path,
+            settings.shared_cache_slots,
+            settings.shared_cache_slot_size,
+            settings.shared_cache_ttl,
+            hold=settings.shared_cache_hold,
+        )
+    engine, SessionLocal = get_db_engine(settings)
+    if settings.db_replica_url:
+        replica_engine, ReplicaSessionLocal = get_db_engine(
+            settings, settings.db_replica_url
+        )
+    if settings.use_async_db:
+        AsyncPool = await get_async_db_pool(settings)
+        use_async_routes(app)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if AsyncPool is not None:
+        await AsyncPool.close()
+    if shared_cache is not None:
+        shared_cache.close()
+
+
+def use_async_routes(app):
+    """Replace the sync endpoints that have an async version."""
+    sync_routes = list(app.router.routes)
+    app.include_router(async_router)
+    async_routes = {
+        (route.path, frozenset(route.methods)): route
+        for route in app.router.routes[len(sync_routes) :]
+    }
+    app.router.routes[:] = [
+        async_routes.get((route.path, frozenset(getattr(route, "methods", ()))), route)
+        for route in sync_routes
+    ]
 
 
 def get_db():
@@ -58,15 +153,127 @@ def get_db():
         db.close()
 
 
-def get_contact_or_404(db: Session, email_id) -> ContactSchema:
+def read_primary(
+    read_primary: bool = Header(
+        False,
+        alias="X-CTMS-Read-Primary",
+        description="Read from the primary database, to see recent writes",
+    )
+) -> bool:
+    """Return True if the client asked to read its own recent writes."""
+    return read_primary
+
+
+def get_read_db(read_primary: bool = Depends(read_primary)):
+    """Get a session for a read-only endpoint, on the replica if configured."""
+    if ReplicaSessionLocal is None or read_primary:
+        db = SessionLocal()
+    else:
+        db = ReplicaSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    timeout = get_settings().db_pool_timeout
+    async with AsyncPool.acquire(timeout=timeout) as connection:
+        yield connection
+
+
+def get_contact_data_or_404(db: Session, email_id, from_cache=True) -> Dict:
     """
-    Get a contact by email_ID, or raise a 404 exception.
+    Get a contact's data by email_ID, or raise a 404 exception.
 
+    The contact cache is checked first, if enabled and from_cache is True.
+    Contacts read from the database are added to the cache.
     """
-    data = get_contact_by_email_id(db, email_id)
+    data = contact_cache.get(email_id) if contact_cache and from_cache else None
     if data is None:
+        started = monotonic()
+        data = get_contact_by_email_id(db, email_id)
+        if data is None:
+            raise HTTPException(status_code=404, detail="Unknown email_id")
+        if contact_cache:
+            contact_cache.set(email_id, data, started)
+    return data
+
+
+class NotModified(Exception):
+    """The client has the current version of the contact."""
+
+    def __init__(self, etag: str):
+        self.etag = etag
+
+
+@app.exception_handler(NotModified)
+async def not_modified_handler(request: Request, exc: NotModified):
+    return Response(status_code=304, headers={"ETag": exc.etag})
+
+
+def contact_etag(updated: Optional[datetime]) -> str:
+    """Return the ETag for a contact's latest update_timestamp."""
+    if updated is None:
+        return '"0"'
+    return f'"{(updated - EPOCH) // timedelta(microseconds=1)}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Return True if an If-None-Match header matches the ETag."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def get_contact_or_304(
+    db: Session, email_id, if_none_match: Optional[str], from_cache=True
+) -> Tuple[Dict, str]:
+    """
+    Get a contact document by email_ID, and its ETag.
+
+    If the client sent a matching If-None-Match header, a NotModified
+    exception is raised, after a query of just the update timestamps.
+    """
+    if if_none_match:
+        updated = get_contact_updated(db, email_id)
+        if updated is not None and etag_matches(if_none_match, contact_etag(updated)):
+            raise NotModified(contact_etag(updated))
+        # The client's version is out of date, and the cached one may be too
+        from_cache = False
+    document = get_contact_data_or_404(db, email_id, from_cache)
+    return document, contact_etag(contact_document_updated(document))
+
+
+def get_contact_group_or_304(
+    db: Session, email_id, model, if_none_match: Optional[str], response: Response
+):
+    """
+    Get the contact's row in one table, for the /contact/* endpoints.
+
+    The ETag is based on the row's update_timestamp. Raises a 404 exception
+    for an unknown contact, and NotModified for a matching If-None-Match.
+    Returns None if the contact has no row in the table.
+    """
+    result = get_contact_group(db, email_id, model)
+    if result is None:
         raise HTTPException(status_code=404, detail="Unknown email_id")
-    return ContactSchema(**data)
+    row = result[1]
+    etag = contact_etag(row.update_timestamp if row else None)
+    if etag_matches(if_none_match, etag):
+        raise NotModified(etag)
+    response.headers["ETag"] = etag
+    return row
+
+
+def invalidate_cached_contacts(*email_ids: UUID):
+    """Remove changed contacts from the contact caches."""
+    for email_id in email_ids:
+        if contact_cache:
+            contact_cache.invalidate(email_id)
+        if shared_cache:
+            shared_cache.invalidate(email_id)
 
 
 def all_ids(
@@ -92,34 +299,93 @@ def all_ids(
     }
 
 
-def get_contacts_by_ids(
-    db: Session,
-    email_id: Optional[UUID] = None,
-    primary_email: Optional[EmailStr] = None,
-    basket_token: Optional[UUID] = None,
-    sfdc_id: Optional[str] = None,
-    mofo_id: Optional[str] = None,
-    amo_user_id: Optional[str] = None,
-    fxa_id: Optional[str] = None,
-    fxa_primary_email: Optional[EmailStr] = None,
-) -> List[ContactSchema]:
-    """Get contacts by any ID.
+def require_any_id(ids):
+    """Raise a 400 exception if no alternate IDs were provided."""
+    if not any(ids.values()):
+        detail = (
+            f"No identifiers provided, at least one is needed: {', '.join(ids.keys())}"
+        )
+        raise HTTPException(status_code=400, detail=detail)
 
-    Callers are expected to set just one ID, but if multiple are set, a contact
-    must match all IDs.
-    """
-    rows = get_contacts_by_any_id(
-        db,
-        email_id,
-        primary_email,
-        basket_token,
-        sfdc_id,
-        mofo_id,
-        amo_user_id,
-        fxa_id,
-        fxa_primary_email,
+
+def with_default_groups(contact: ContactSchema) -> ContactSchema:
+    """Return a contact with empty groups instead of missing groups."""
+    return ContactSchema(
+        amo=contact.amo or AddOnsSchema(),
+        email=contact.email or EmailSchema(),
+        fxa=contact.fxa or FirefoxAccountsSchema(),
+        newsletters=contact.newsletters or [],
+        vpn_waitlist=contact.vpn_waitlist or VpnWaitlistSchema(),
     )
-    return [ContactSchema(**data) for data in rows]
+
+
+# The response fields of each group, and the defaults for a missing group
+RESPONSE_GROUPS = {
+    "amo": AddOnsSchema,
+    "email": EmailSchema,
+    "fxa": FirefoxAccountsSchema,
+    "vpn_waitlist": VpnWaitlistSchema,
+}
+EMPTY_GROUPS = {
+    "amo": json.loads(AddOnsSchema().json()),
+    "fxa": json.loads(FirefoxAccountsSchema().json()),
+    "vpn_waitlist": json.loads(VpnWaitlistSchema().json()),
+}
+
+
+def _project(row: Dict, schema) -> Dict:
+    """Project a database row onto a schema's fields, formatting datetimes."""
+    data = {}
+    for name, field in schema.__fields__.items():
+        value = row.get(name)
+        if value and field.type_ is datetime:
+            # Same format as pydantic, Postgres trims zeros from microseconds
+            value = parse_datetime(value).isoformat()
+        data[name] = value
+    return data
+
+
+def contact_response_data(document: Dict) -> Dict:
+    """
+    Return the response data for a contact document from the database.
+
+    The document was validated when it was written, so it is projected onto
+    the response fields without building pydantic models. Missing groups are
+    returned with default values, like with_default_groups.
+    """
+    data: Dict[str, Any] = {
+        group: (
+            _project(document[group], schema)
+            if document[group]
+            else dict(EMPTY_GROUPS[group])
+        )
+        for group, schema in RESPONSE_GROUPS.items()
+    }
+    data["newsletters"] = [
+        _project(newsletter, NewsletterSchema) for newsletter in document["newsletters"]
+    ]
+    return data
+
+
+def ctms_response_data(document: Dict) -> Dict:
+    """Return the CTMSResponse data for a contact document from the database."""
+    data = contact_response_data(document)
+    data["status"] = "ok"
+    return data
+
+
+def encode_updates_cursor(updated: datetime, email_id: UUID) -> str:
+    """Encode the position in the updates feed as an opaque string."""
+    return urlsafe_b64encode(f"{updated.isoformat()},{email_id}".encode()).decode()
+
+
+def decode_updates_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Decode a cursor from encode_updates_cursor, or raise a 400 exception."""
+    try:
+        updated, email_id = urlsafe_b64decode(cursor.encode()).decode().split(",")
+        return datetime.fromisoformat(updated), UUID(email_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @app.get("/", include_in_schema=False)
@@ -142,23 +408,34 @@ def root():
     responses={400: {"model": BadRequestResponse}},
     tags=["Public"],
 )
-def read_ctms_by_any_id(db: Session = Depends(get_db), ids=Depends(all_ids)):
-    if not any(ids.values()):
-        detail = (
-            f"No identifiers provided, at least one is needed: {', '.join(ids.keys())}"
-        )
-        raise HTTPException(status_code=400, detail=detail)
-    contacts = get_contacts_by_ids(db, **ids)
-    return [
-        ContactSchema(
-            amo=contact.amo or AddOnsSchema(),
-            email=contact.email or EmailSchema(),
-            fxa=contact.fxa or FirefoxAccountsSchema(),
-            newsletters=contact.newsletters or [],
-            vpn_waitlist=contact.vpn_waitlist or VpnWaitlistSchema(),
-        )
-        for contact in contacts
-    ]
+def read_ctms_by_any_id(db: Session = Depends(get_read_db), ids=Depends(all_ids)):
+    require_any_id(ids)
+    documents = get_contact_documents_by_any_id(db, **ids)
+    body = dump_json([contact_response_data(document) for document in documents])
+    return Response(content=body, media_type="application/json")
+
+
+@app.get(
+    "/ctms/export",
+    summary="Export all contacts as newline-delimited JSON",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {"application/x-ndjson": {}},
+            "description": "One contact per line, in the format of GET /ctms",
+        }
+    },
+    tags=["Public"],
+)
+def export_ctms(db: Session = Depends(get_read_db)):
+    def contact_lines():
+        for chunk in iter_contacts(db):
+            yield b"".join(
+                dump_json(with_default_groups(ContactSchema(**data)).dict()) + b"\n"
+                for data in chunk
+            )
+
+    return StreamingResponse(contact_lines(), media_type="application/x-ndjson")
 
 
 @app.get(
@@ -169,17 +446,31 @@ def read_ctms_by_any_id(db: Session = Depends(get_db), ids=Depends(all_ids)):
     tags=["Public"],
 )
 def read_ctms_by_email_id(
-    email_id: UUID = Path(..., title="The Email ID"), db: Session = Depends(get_db)
+    email_id: UUID = Path(..., title="The Email ID"),
+    db: Session = Depends(get_read_db),
+    if_none_match: Optional[str] = Header(None),
+    primary: bool = Depends(read_primary),
 ):
-    contact = get_contact_or_404(db, email_id)
-    return CTMSResponse(
-        amo=contact.amo or AddOnsSchema(),
-        email=contact.email or EmailSchema(),
-        fxa=contact.fxa or FirefoxAccountsSchema(),
-        newsletters=contact.newsletters or [],
-        vpn_waitlist=contact.vpn_waitlist or VpnWaitlistSchema(),
-        status="ok",
-    )
+    # The shared cache holds the ETag and the response body. It isn't used
+    # for primary reads, which should see the client's own writes. It is
+    # filled from the database, not the contact cache, so that its entries
+    # are no older than their fill time.
+    use_shared_cache = shared_cache is not None and not primary
+    cached = shared_cache.get(email_id) if use_shared_cache else None
+    if cached is None:
+        started = time()
+        document, etag = get_contact_or_304(
+            db, email_id, if_none_match, from_cache=not primary and not use_shared_cache
+        )
+        body = dump_json(ctms_response_data(document))
+        if use_shared_cache:
+            shared_cache.set(email_id, etag.encode("ascii") + b"\n" + body, started)
+    else:
+        raw_etag, body = cached.split(b"\n", 1)
+        etag = raw_etag.decode("ascii")
+        if etag_matches(if_none_match, etag):
+            raise NotModified(etag)
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
 
 @app.post(
@@ -192,15 +483,88 @@ def create_ctms_contact(
 ):
     contact.email.email_id = contact.email.email_id or uuid4()
     email_id = contact.email.email_id
-    existing = get_contact_by_email_id(db, email_id)
-    if existing:
-        if ContactInSchema(**existing) == contact:
-            return
+    # Insert first, and only compare with the existing contact on a conflict
+    try:
+        created = email_id in create_contacts(db, [contact])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        if isinstance(e, IntegrityError):
+            created = False
         else:
-            raise HTTPException(status_code=409, detail="Contact already exists")
+            raise
+    if created:
+        invalidate_cached_contacts(email_id)
+        return
+    content_hash = contact_content_hash(contact)
+    existing_hash = get_content_hashes(db, [email_id], {email_id: content_hash})
+    if existing_hash.get(email_id) != content_hash:
+        raise HTTPException(status_code=409, detail="Contact already exists")
+
+
+@app.patch(
+    "/ctms/{email_id}",
+    summary="Update parts of a contact",
+    response_model=CTMSResponse,
+    responses={404: {"model": NotFoundResponse}},
+)
+def patch_ctms_contact(
+    patch: ContactPatchSchema,
+    email_id: UUID = Path(..., title="The Email ID"),
+    db: Session = Depends(get_db),
+):
     try:
-        create_contact(db, email_id, contact)
+        document = update_contact(db, email_id, patch)
         db.commit()
+    except Exception as e:
+        db.rollback()
+        if isinstance(e, IntegrityError):
+            raise HTTPException(
+                status_code=409, detail="Contact conflicts with an existing contact"
+            )
+        else:
+            raise
+    if document is None:
+        raise HTTPException(status_code=404, detail="Unknown email_id")
+    invalidate_cached_contacts(email_id)
+    etag = contact_etag(contact_document_updated(document))
+    body = dump_json(ctms_response_data(document))
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+@app.post(
+    "/ctms/batch",
+    summary="Get the contacts for many email_ids",
+    response_model=ContactBatchResponse,
+    tags=["Public"],
+)
+def read_ctms_batch(batch: ContactBatchRequest, db: Session = Depends(get_read_db)):
+    requested = list(dict.fromkeys(batch.email_ids))
+    rows = get_contacts_by_email_ids(db, requested)
+    found = {}
+    for data in rows:
+        contact = with_default_groups(ContactSchema(**data))
+        found[contact.email.email_id] = contact
+    response = ContactBatchResponse(
+        contacts=[found[email_id] for email_id in requested if email_id in found],
+        not_found=[email_id for email_id in requested if email_id not in found],
+    )
+    # Already validated, skip FastAPI's response model validation
+    return FastJSONResponse(response.dict())
+
+
+@app.post(
+    "/ctms/bulk",
+    summary="Create many contacts, generating ids",
+    response_model=ContactBulkResponse,
+)
+def create_ctms_contacts(bulk: ContactBulkRequest, db: Session = Depends(get_db)):
+    for contact in bulk.contacts:
+        contact.email.email_id = contact.email.email_id or uuid4()
+    try:
+        created = create_contacts(db, bulk.contacts)
+        db.commit()
+        invalidate_cached_contacts(*created)
     except Exception as e:
         db.rollback()
         if isinstance(e, IntegrityError):
@@ -208,6 +572,105 @@ def create_ctms_contact(
         else:
             raise
 
+    # Check skipped contacts against existing ones, like POST /ctms
+    first: Dict[UUID, ContactInSchema] = {}
+    for contact in bulk.contacts:
+        first.setdefault(contact.email.email_id, contact)
+    # The first contact for an email_id is compared with the existing contact,
+    # and repeats of the email_id in the batch with the first contact
+    skipped = [email_id for email_id in first if email_id not in created]
+    repeated = len(bulk.contacts) > len(first)
+    first_hashes = {
+        email_id: contact_content_hash(contact)
+        for email_id, contact in first.items()
+        if email_id not in created or repeated
+    }
+    existing_hashes = get_content_hashes(db, skipped, first_hashes) if skipped else {}
+    results = []
+    for contact in bulk.contacts:
+        email_id = contact.email.email_id
+        if email_id in created and first[email_id] is contact:
+            status = "created"
+        else:
+            if email_id in created:
+                original_hash = first_hashes[email_id]
+            else:
+                original_hash = existing_hashes.get(email_id)
+            if first[email_id] is contact:
+                content_hash = first_hashes[email_id]
+            else:
+                content_hash = contact_content_hash(contact)
+            same = original_hash == content_hash
+            status = "exists" if same else "conflict"
+        results.append(ContactBulkResult(email_id=email_id, status=status))
+    return ContactBulkResponse(results=results)
+
+
+@app.post(
+    "/newsletters/bulk",
+    summary="Set a newsletter subscription for many contacts",
+    response_model=NewsletterBulkResponse,
+)
+def update_newsletter_bulk(bulk: NewsletterBulkRequest, db: Session = Depends(get_db)):
+    fields = bulk.dict(
+        exclude_unset=True, exclude={"name", "email_ids", "basket_tokens"}
+    )
+    fields["subscribed"] = bulk.subscribed
+    rows = update_newsletter_subscriptions(
+        db, bulk.name, fields, bulk.email_ids, bulk.basket_tokens
+    )
+    db.commit()
+    changed = [email_id for email_id, _, is_changed in rows if is_changed]
+    invalidate_cached_contacts(*changed)
+
+    found_ids = {email_id for email_id, _, _ in rows}
+    found_tokens = {basket_token for _, basket_token, _ in rows}
+    not_found = [email_id for email_id in bulk.email_ids if email_id not in found_ids]
+    not_found.extend(
+        token for token in bulk.basket_tokens if str(token) not in found_tokens
+    )
+    return NewsletterBulkResponse(updated=len(changed), not_found=not_found)
+
+
+@app.get(
+    "/updates",
+    summary="Get contacts updated since a time",
+    description=(
+        "Contacts are ordered by the time their data was updated, which is"
+        " the start time of the updating transaction. A slow update can"
+        " commit after later positions were read, so clients that poll"
+        " should start each new read with a since time a few minutes before"
+        " the last position they read, and ignore repeated contacts."
+    ),
+    response_model=ContactUpdatesResponse,
+    responses={400: {"model": BadRequestResponse}},
+    tags=["Public"],
+)
+def read_updates(
+    since: Optional[datetime] = Query(
+        None, description="Start time, required without a cursor"
+    ),
+    cursor: Optional[str] = Query(
+        None, description="The next_cursor from the previous page"
+    ),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db),
+):
+    if cursor:
+        since, after_email_id = decode_updates_cursor(cursor)
+    elif since:
+        after_email_id = None
+    else:
+        raise HTTPException(status_code=400, detail="since or cursor is required")
+    page, last = get_contacts_updated_since(db, since, after_email_id, limit)
+    next_cursor = encode_updates_cursor(*last) if last else None
+    response = ContactUpdatesResponse(
+        contacts=[with_default_groups(ContactSchema(**data)) for data in page],
+        next_cursor=next_cursor,
+    )
+    # Already validated, skip FastAPI's response model validation
+    return FastJSONResponse(response.dict())
+
 
 @app.get(
     "/identities",
@@ -216,14 +679,9 @@ def create_ctms_contact(
     responses={400: {"model": BadRequestResponse}},
     tags=["Private"],
 )
-def read_identities(db: Session = Depends(get_db), ids=Depends(all_ids)):
-    if not any(ids.values()):
-        detail = (
-            f"No identifiers provided, at least one is needed: {', '.join(ids.keys())}"
-        )
-        raise HTTPException(status_code=400, detail=detail)
-    contacts = get_contacts_by_ids(db, **ids)
-    return [contact.as_identity_response() for contact in contacts]
+def read_identities(db: Session = Depends(get_read_db), ids=Depends(all_ids)):
+    require_any_id(ids)
+    return get_identities_by_any_id(db, **ids)
 
 
 @app.get(
@@ -234,10 +692,12 @@ def read_identities(db: Session = Depends(get_db), ids=Depends(all_ids)):
     tags=["Private"],
 )
 def read_identity(
-    email_id: UUID = Path(..., title="The email ID"), db: Session = Depends(get_db)
+    email_id: UUID = Path(..., title="The email ID"), db: Session = Depends(get_read_db)
 ):
-    contact = get_contact_or_404(db, email_id)
-    return contact.as_identity_response()
+    identity = get_identity_by_email_id(db, email_id)
+    if identity is None:
+        raise HTTPException(status_code=404, detail="Unknown email_id")
+    return identity
 
 
 @app.get(
@@ -248,10 +708,12 @@ def read_identity(
     tags=["Private"],
 )
 def read_contact_main(
-    email_id: UUID = Path(..., title="The email ID"), db: Session = Depends(get_db)
+    response: Response,
+    email_id: UUID = Path(..., title="The email ID"),
+    db: Session = Depends(get_read_db),
+    if_none_match: Optional[str] = Header(None),
 ):
-    contact = get_contact_or_404(db, email_id)
-    return contact.email
+    return get_contact_group_or_304(db, email_id, Email, if_none_match, response)
 
 
 @app.get(
@@ -262,10 +724,13 @@ def read_contact_main(
     tags=["Private"],
 )
 def read_contact_amo(
-    email_id: UUID = Path(..., title="The email ID"), db: Session = Depends(get_db)
+    response: Response,
+    email_id: UUID = Path(..., title="The email ID"),
+    db: Session = Depends(get_read_db),
+    if_none_match: Optional[str] = Header(None),
 ):
-    contact = get_contact_or_404(db, email_id)
-    return contact.amo or AddOnsSchema()
+    row = get_contact_group_or_304(db, email_id, AmoAccount, if_none_match, response)
+    return row or AddOnsSchema()
 
 
 @app.get(
@@ -276,10 +741,13 @@ def read_contact_amo(
     tags=["Private"],
 )
 def read_contact_fpn(
-    email_id: UUID = Path(..., title="The email ID"), db: Session = Depends(get_db)
+    response: Response,
+    email_id: UUID = Path(..., title="The email ID"),
+    db: Session = Depends(get_read_db),
+    if_none_match: Optional[str] = Header(None),
 ):
-    contact = get_contact_or_404(db, email_id)
-    return contact.vpn_waitlist or VpnWaitlistSchema()
+    row = get_contact_group_or_304(db, email_id, VpnWaitlist, if_none_match, response)
+    return row or VpnWaitlistSchema()
 
 
 @app.get(
@@ -290,17 +758,87 @@ def read_contact_fpn(
     tags=["Private"],
 )
 def read_contact_fxa(
-    email_id: UUID = Path(..., title="The email ID"), db: Session = Depends(get_db)
+    response: Response,
+    email_id: UUID = Path(..., title="The email ID"),
+    db: Session = Depends(get_read_db),
+    if_none_match: Optional[str] = Header(None),
 ):
-    contact = get_contact_or_404(db, email_id)
-    return contact.fxa or FirefoxAccountsSchema()
+    row = get_contact_group_or_304(
+        db, email_id, FirefoxAccount, if_none_match, response
+    )
+    return row or FirefoxAccountsSchema()
 
 
 # NOTE:  This endpoint should provide a better proxy of "health".  It presently is a
 # better proxy for application availability as opposed to health.
 @app.get("/health", tags=["Platform"])
 def health():
-    return {"health": "OK"}, 200
+    data = {"health": "OK", "database_pool": pool_metrics.as_dict()}
+    if contact_cache:
+        data["contact_cache"] = contact_cache.stats()
+    if shared_cache:
+        data["shared_cache"] = shared_cache.stats()
+    return data, 200
+
+
+@app.get("/metrics", tags=["Platform"])
+def metrics():
+    return Response(generate_latest(get_registry()), media_type=CONTENT_TYPE_LATEST)
+
+
+@async_router.get(
+    "/ctms",
+    summary="Get all contacts matching alternate IDs",
+    response_model=List[ContactSchema],
+    responses={400: {"model": BadRequestResponse}},
+    tags=["Public"],
+)
+async def read_ctms_by_any_id_async(conn=Depends(get_async_db), ids=Depends(all_ids)):
+    require_any_id(ids)
+    documents = await async_crud.get_contacts_by_any_id(conn, **ids)
+    body = dump_json([contact_response_data(document) for document in documents])
+    return Response(content=body, media_type="application/json")
+
+
+@async_router.get(
+    "/ctms/{email_id}",
+    summary="Get a contact by email_id",
+    response_model=CTMSResponse,
+    responses={404: {"model": NotFoundResponse}},
+    tags=["Public"],
+)
+async def read_ctms_by_email_id_async(
+    email_id: UUID = Path(..., title="The Email ID"),
+    conn=Depends(get_async_db),
+    if_none_match: Optional[str] = Header(None),
+):
+    document = await async_crud.get_contact_by_email_id(conn, email_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Unknown email_id")
+    etag = contact_etag(contact_document_updated(document))
+    if etag_matches(if_none_match, etag):
+        raise NotModified(etag)
+    body = dump_json(ctms_response_data(document))
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+@async_router.post(
+    "/ctms",
+    summary="Create a contact, generating an id",
+)
+async def create_ctms_contact_async(
+    contact: ContactInSchema, conn=Depends(get_async_db)
+):
+    contact.email.email_id = contact.email.email_id or uuid4()
+    email_id = contact.email.email_id
+    # Insert first, and only compare with the existing contact on a conflict
+    if await async_crud.create_contact(conn, email_id, contact):
+        invalidate_cached_contacts(email_id)
+        return
+    content_hash = contact_content_hash(contact)
+    existing_hash = await async_crud.get_content_hash(conn, email_id, content_hash)
+    if existing_hash != content_hash:
+        raise HTTPException(status_code=409, detail="Contact already exists")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,150 @@
+"""
+Async versions of the crud functions, for an asyncpg connection.
+
+The statements are built by the same functions as the sync versions in
+ctms.crud, and compiled for asyncpg's numbered parameters.
+"""
+import json
+import re
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from pydantic import UUID4, EmailStr
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+try:
+    from asyncpg import IntegrityConstraintViolationError
+except ImportError:  # pragma: no cover
+    IntegrityConstraintViolationError = None
+
+from .crud import (
+    contact_content_hash,
+    contact_document_statement,
+    contact_id_criteria,
+    contact_rows,
+    insert_statement,
+)
+from .metrics import record_query
+from .models import Email
+from .schemas import ContactInSchema
+
+_dialect = postgresql.dialect(paramstyle="numeric")
+_numeric_param = re.compile(r"(?<!:):(\d+)")
+
+
+def compile_statement(statement) -> Tuple[str, List[Any]]:
+    """Compile a SQLAlchemy statement to asyncpg's SQL and arguments."""
+    compiled = statement.compile(dialect=_dialect)
+    sql = _numeric_param.sub(r"$\1", str(compiled))
+    params = compiled.construct_params()
+    args = []
+    for name in compiled.positiontup:
+        value = params[name]
+        processor = compiled._bind_processors.get(name)
+        if processor:
+            value = processor(value)
+        if isinstance(value, UUID) and not isinstance(
+            compiled.binds[name].type, postgresql.UUID
+        ):
+            # Like basket_token, a UUID stored as a string
+            value = str(value)
+        args.append(value)
+    return sql, args
+
+
+async def timed(query, sql: str, *args):
+    """Await a query method of the connection, and record it in the metrics."""
+    start = perf_counter()
+    try:
+        return await query(sql, *args)
+    finally:
+        record_query(perf_counter() - start)
+
+
+async def get_contact_by_email_id(conn, email_id: UUID4) -> Optional[Dict]:
+    """Get all the data for a contact."""
+    sql, args = compile_statement(
+        contact_document_statement(Email.email_id == email_id)
+    )
+    document = await timed(conn.fetchval, sql, *args)
+    if document is None:
+        return None
+    return json.loads(document)
+
+
+async def get_contacts_by_any_id(
+    conn,
+    email_id: Optional[UUID4] = None,
+    primary_email: Optional[EmailStr] = None,
+    basket_token: Optional[UUID4] = None,
+    sfdc_id: Optional[str] = None,
+    mofo_id: Optional[str] = None,
+    amo_user_id: Optional[str] = None,
+    fxa_id: Optional[str] = None,
+    fxa_primary_email: Optional[EmailStr] = None,
+) -> List[Dict]:
+    """Get all the data for multiple contacts by IDs."""
+    criteria = contact_id_criteria(
+        email_id,
+        primary_email,
+        basket_token,
+        sfdc_id,
+        mofo_id,
+        amo_user_id,
+        fxa_id,
+        fxa_primary_email,
+    )
+    sql, args = compile_statement(contact_document_statement(*criteria))
+    return [json.loads(row[0]) for row in await timed(conn.fetch, sql, *args)]
+
+
+async def get_content_hash(
+    conn, email_id: UUID4, expected: Optional[str] = None
+) -> Optional[str]:
+    """
+    Get the content hash of an existing contact, or None if not found.
+
+    Like crud.get_content_hashes, a stored hash that differs from the
+    expected one is recomputed from the contact's data.
+    """
+    sql, args = compile_statement(
+        select([Email.email_id, Email.content_hash]).where(Email.email_id == email_id)
+    )
+    row = await timed(conn.fetchrow, sql, *args)
+    if row is None:
+        return None
+    if row["content_hash"] is None or (expected and row["content_hash"] != expected):
+        # Contacts without a hash, or with one from older schemas, are hashed
+        # from their data
+        document = await get_contact_by_email_id(conn, email_id)
+        return contact_content_hash(ContactInSchema(**document))
+    return row["content_hash"]
+
+
+async def create_contact(conn, email_id: UUID4, contact: ContactInSchema) -> bool:
+    """
+    Create a contact, in a transaction.
+
+    The emails row is inserted first, skipping a conflict with an existing
+    contact. Returns False if the contact was not created.
+    """
+    rows = contact_rows(email_id, contact)
+    email_statement = (
+        insert_statement(Email, rows.pop(Email))
+        .on_conflict_do_nothing()
+        .returning(Email.email_id)
+    )
+    try:
+        async with conn.transaction():
+            sql, args = compile_statement(email_statement)
+            if await timed(conn.fetchval, sql, *args) is None:
+                return False
+            for model, model_rows in rows.items():
+                if model_rows:
+                    sql, args = compile_statement(insert_statement(model, model_rows))
+                    await timed(conn.execute, sql, *args)
+    except IntegrityConstraintViolationError:
+        return False
+    return True
@@ -0,0 +1,264 @@
+"""Caches of contact data, for the hot read endpoints."""
+import fcntl
+import mmap
+import os
+import struct
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+from time import monotonic, time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+from uuid import UUID
+
+
+class ContactCache:
+    """
+    A size-bounded cache with LRU eviction and a time-to-live.
+
+    The cache is per worker process. Write paths should call invalidate() for
+    the contacts they change, and other processes may see stale data for up
+    to ttl seconds.
+
+    Like SharedResponseCache, set() is refused for a value read less than
+    hold seconds after the key was invalidated, so that a read from a replica
+    that hasn't replayed the write doesn't cache the old value.
+    """
+
+    def __init__(self, max_size: int, ttl: float, hold=2.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hold = hold
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._held: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, value = entry
+            if expires <= monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, started: Optional[float] = None):
+        """
+        Cache a value, evicting the least recently used if full.
+
+        started is the monotonic() time before the value was read. The value
+        is not cached if the key was invalidated less than hold seconds before
+        then.
+        """
+        now = monotonic()
+        if started is None:
+            started = now
+        with self._lock:
+            if started < self._held.get(key, 0.0):
+                return
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Remove the key, and hold off new values for it."""
+        now = monotonic()
+        with self._lock:
+            self._entries.pop(key, None)
+            self._held.pop(key, None)
+            self._held[key] = now + self.hold
+            # Holds are in the order they end
+            while self._held and next(iter(self._held.values())) <= now:
+                self._held.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._held.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class SharedResponseCache:
+    """
+    A cache of serialized responses, shared by the worker processes on a host.
+
+    The cache is a memory-mapped file, divided into fixed-size slots. A key
+    hashes to a set of slots, and a full set replaces the entry closest to
+    expiring. Readers don't lock, but check a per-slot sequence number that
+    is odd while the slot is written. Writers take a thread lock and a file
+    lock. Because the memory is shared, invalidate() removes the entry for all
+    workers.
+
+    invalidate() leaves an empty entry that expires after hold seconds, and
+    set() is refused for a value read from the database before then. This
+    keeps out values read just before a write, or from a replica that hasn't
+    replayed it yet. A read that takes longer than hold, or that is slower
+    than the replica lag plus hold, can still cache an old value until ttl.
+    """
+
+    MAGIC = b"CTMSRSP1"
+    HEADER = struct.Struct("<8sIII")  # magic, slot count, slot size, ways
+    HEADER_SIZE = 64
+    SLOT = struct.Struct("<Q16sdI")  # sequence, key, expires, length
+    SLOT_HEADER_SIZE = 40
+    EMPTY_KEY = bytes(16)
+    RETRIES = 3
+
+    def __init__(
+        self, path: str, slots: int, slot_size: int, ttl: float, ways=4, hold=2.0
+    ):
+        if slot_size <= self.SLOT_HEADER_SIZE:
+            raise ValueError("slot_size is too small")
+        self.ways = min(ways, slots)
+        self.sets = slots // self.ways
+        self.slots = self.sets * self.ways
+        self.slot_size = slot_size
+        self.max_length = slot_size - self.SLOT_HEADER_SIZE
+        self.ttl = ttl
+        self.hold = hold
+        self.size = self.HEADER_SIZE + self.slots * slot_size
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked():
+            header = self.HEADER.pack(self.MAGIC, self.slots, slot_size, self.ways)
+            if os.pread(self._fd, self.HEADER.size, 0) != header:
+                # New file, or a different layout. Start empty.
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self.size)
+                os.pwrite(self._fd, header, 0)
+        self._map = mmap.mmap(self._fd, self.size)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _offsets(self, key: UUID) -> List[int]:
+        first = (key.int % self.sets) * self.ways
+        return [
+            self.HEADER_SIZE + slot * self.slot_size
+            for slot in range(first, first + self.ways)
+        ]
+
+    def _read(self, offset: int) -> Optional[Tuple[bytes, float, bytes]]:
+        """Read a slot's key, expiration and value, or None if being written."""
+        for attempt in range(self.RETRIES):
+            seq, key, expires, length = self.SLOT.unpack_from(self._map, offset)
+            if seq % 2:
+                continue
+            start = offset + self.SLOT_HEADER_SIZE
+            value = self._map[start : start + min(length, self.max_length)]
+            if self.SLOT.unpack_from(self._map, offset)[0] == seq:
+                return key, expires, value
+        return None
+
+    def _write(self, offset: int, key: bytes, expires: float, value: bytes):
+        """Write a slot, holding the write lock."""
+        seq = self.SLOT.unpack_from(self._map, offset)[0]
+        struct.pack_into("<Q", self._map, offset, seq + 1)
+        start = offset + self.SLOT_HEADER_SIZE
+        self._map[start : start + len(value)] = value
+        self.SLOT.pack_into(self._map, offset, seq + 1, key, expires, len(value))
+        struct.pack_into("<Q", self._map, offset, seq + 2)
+
+    def get(self, key: UUID) -> Optional[bytes]:
+        """Return the cached value, or None if missing or expired."""
+        now = time()
+        for offset in self._offsets(key):
+            slot = self._read(offset)
+            if slot and slot[0] == key.bytes and slot[1] > now and slot[2]:
+                self.hits += 1
+                return slot[2]
+        self.misses += 1
+        return None
+
+    def _victim(self, key: UUID, now: float) -> Tuple[int, float, bool]:
+        """
+        Return the slot to write a key to, holding the write lock.
+
+        Also returns the time until which the key is held off, after an
+        invalidation, and True if the slot has another key's live entry.
+        """
+        victim, victim_expires = None, None
+        for offset in self._offsets(key):
+            slot_key, expires, length = self.SLOT.unpack_from(self._map, offset)[1:]
+            if slot_key == key.bytes:
+                return offset, (0.0 if length else expires), False
+            if slot_key == self.EMPTY_KEY or expires <= now:
+                expires = 0.0
+            if victim_expires is None or expires < victim_expires:
+                victim, victim_expires = offset, expires
+        return victim, 0.0, bool(victim_expires)
+
+    def set(self, key: UUID, value: bytes, started: Optional[float] = None):
+        """
+        Cache a value. Values larger than a slot are not cached.
+
+        started is the time() before the value was read. The value is not
+        cached if the key was invalidated less than hold seconds before then.
+        """
+        if len(value) > self.max_length:
+            return
+        now = time()
+        if started is None:
+            started = now
+        with self._locked():
+            victim, held_until, evicts = self._victim(key, now)
+            if started < held_until:
+                return
+            if evicts:
+                self.evictions += 1
+            self._write(victim, key.bytes, now + self.ttl, value)
+
+    def invalidate(self, key: UUID):
+        """Remove the key for all workers, and hold off new values for it."""
+        now = time()
+        with self._locked():
+            victim, _, evicts = self._victim(key, now)
+            if evicts:
+                self.evictions += 1
+            self._write(victim, key.bytes, now + self.hold, b"")
+
+    def clear(self):
+        with self._locked():
+            for slot in range(self.slots):
+                offset = self.HEADER_SIZE + slot * self.slot_size
+                self._write(offset, self.EMPTY_KEY, 0.0, b"")
+
+    def stats(self) -> Dict[str, int]:
+        """Return this worker's counters."""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
@@ -1,8 +1,60 @@
-from pydantic import BaseSettings, PostgresDsn
+from typing import Optional
+
+from pydantic import BaseSettings, PostgresDsn, root_validator
 
 
 class Settings(BaseSettings):
     db_url: PostgresDsn
+    db_replica_url: Optional[PostgresDsn] = None  # For read-only endpoints
+    # Serve some endpoints with asyncpg. The replica and the caches are not
+    # supported, and the pool settings are shared with the sync pool.
+    use_async_db: bool = False
+
+    # Connection pool, per worker process
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0  # Seconds to wait for a connection
+    db_pool_pre_ping: bool = True  # Test connections, to survive failovers
+    db_pool_recycle: int = -1  # Seconds before a connection is replaced
+    db_statement_cache_size: int = 100  # Prepared statements per asyncpg connection
+
+    # Connect through an external transaction pooler like PgBouncer, with no
+    # client-side pool and no prepared statements. The pool settings are ignored.
+    db_external_pooler: bool = False
+
+    # In-process cache of contacts, per worker
+    use_contact_cache: bool = False
+    contact_cache_size: int = 10000
+    contact_cache_ttl: float = 30.0  # Seconds
+    # Seconds after an invalidation that reads don't fill the contact cache
+    contact_cache_hold: float = 2.0
+
+    # Cache of GET /ctms/{email_id} responses, shared by the workers on a host,
+    # in a memory-mapped file like /dev/shm/ctms-cache
+    shared_cache_path: Optional[str] = None
+    shared_cache_slots: int = 65536
+    shared_cache_slot_size: int = 4096  # Bytes, larger responses are not cached
+    shared_cache_ttl: float = 30.0  # Seconds
+    # Seconds after an invalidation that reads don't fill the shared cache,
+    # longer than the replica lag
+    shared_cache_hold: float = 2.0
+
+    @root_validator(skip_on_failure=True)
+    def check_async_db(cls, values):
+        """The async endpoints don't have the replica or the caches."""
+        if values["use_async_db"]:
+            unsupported = [
+                name
+                for name in ("db_replica_url", "use_contact_cache", "shared_cache_path")
+                if values[name]
+            ]
+            if unsupported:
+                raise ValueError(
+                    f"use_async_db can't be combined with {', '.join(unsupported)}"
+                )
+            if values["db_pool_size"] < 2:
+                raise ValueError("use_async_db needs a db_pool_size of at least 2")
+        return values
 
     class Config:
         env_prefix = "ctms_"
@@ -1,12 +1,40 @@
-from typing import Dict, List, Optional
+import json
+from collections import Counter
+from datetime import datetime
+from hashlib import sha256
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Type
 
-from pydantic import UUID4, EmailStr
+from pydantic import UUID4, BaseModel, EmailStr
+from pydantic.datetime_parse import parse_datetime
+from sqlalchemy import (
+    JSON,
+    String,
+    and_,
+    any_,
+    case,
+    cast,
+    delete,
+    func,
+    literal,
+    literal_column,
+    null,
+    or_,
+    select,
+    tuple_,
+    union,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
 from sqlalchemy.orm import Session
 
 from .models import AmoAccount, Email, FirefoxAccount, Newsletter, VpnWaitlist
 from .schemas import (
     AddOnsSchema,
     ContactInSchema,
+    ContactPatchSchema,
     ContactSchema,
     EmailInSchema,
     EmailSchema,
@@ -20,31 +48,110 @@ def get_email_by_email_id(db: Session, email_id: UUID4):
     return db.query(Email).filter(Email.email_id == email_id).first()
 
 
-def get_contact_by_email_id(db: Session, email_id: UUID4):
-    """Get all the data for a contact."""
-    result = (
-        db.query(Email, AmoAccount, FirefoxAccount, VpnWaitlist)
-        .outerjoin(AmoAccount, Email.email_id == AmoAccount.email_id)
-        .outerjoin(FirefoxAccount, Email.email_id == FirefoxAccount.email_id)
-        .outerjoin(VpnWaitlist, Email.email_id == VpnWaitlist.email_id)
-        .filter(Email.email_id == email_id)
-        .first()
+def get_contact_group(db: Session, email_id: UUID4, model):
+    """
+    Get a contact's row in one table, checking that the contact exists.
+
+    Returns None for an unknown email_id, or an (email_id, row) tuple, where
+    the row is None if the contact has no row in the table.
+    """
+    query = db.query(Email.email_id, model)
+    if model is not Email:
+        query = query.outerjoin(model, Email.email_id == model.email_id)
+    return query.filter(Email.email_id == email_id).first()
+
+
+def get_newsletters_by_email_ids(
+    db: Session, email_ids: List[UUID4]
+) -> Dict[UUID4, List[Newsletter]]:
+    """Get the newsletters for several contacts in one query, keyed by email_id."""
+    newsletters: Dict[UUID4, List[Newsletter]] = {}
+    if not email_ids:
+        return newsletters
+    results = (
+        db.query(Newsletter)
+        .filter(Newsletter.email_id.in_(email_ids))
+        .order_by(Newsletter.id)
+        .all()
     )
-    if result is None:
-        return None
-    email, amo, fxa, vpn_waitlist = result
-    newsletters = db.query(Newsletter).filter(Newsletter.email_id == email_id).all()
-    return {
-        "amo": amo,
-        "email": email,
-        "fxa": fxa,
-        "newsletters": newsletters,
-        "vpn_waitlist": vpn_waitlist,
-    }
+    for newsletter in results:
+        newsletters.setdefault(newsletter.email_id, []).append(newsletter)
+    return newsletters
 
 
-def get_contacts_by_any_id(
-    db: Session,
+def _json_object(model, exclude=("id", "email_id")):
+    """Build a JSON object of a model's columns in the database."""
+    args = []
+    for column in model.__table__.columns:
+        if column.name not in exclude:
+            args.extend((literal_column(f"'{column.name}'"), column))
+    return func.json_build_object(*args)
+
+
+def _json_object_or_null(model):
+    """Build a JSON object for an outer-joined model, or null if there is no row."""
+    return case([(model.id.is_(None), null())], else_=_json_object(model))
+
+
+def contact_document_statement(*criteria):
+    """
+    Return a statement for contact documents, one JSON document per row.
+
+    The contact document is assembled by the database in a single statement,
+    as nested objects ready to be parsed into a ContactSchema.
+    """
+    newsletters = (
+        select(
+            [
+                func.coalesce(
+                    func.json_agg(
+                        aggregate_order_by(
+                            _json_object(Newsletter),
+                            Newsletter.id,
+                        )
+                    ),
+                    literal_column("'[]'::json"),
+                )
+            ]
+        )
+        .where(Newsletter.email_id == Email.email_id)
+        .as_scalar()
+    )
+    document = func.json_build_object(
+        literal_column("'amo'"),
+        _json_object_or_null(AmoAccount),
+        literal_column("'email'"),
+        _json_object(Email, exclude=()),
+        literal_column("'fxa'"),
+        _json_object_or_null(FirefoxAccount),
+        literal_column("'newsletters'"),
+        newsletters,
+        literal_column("'vpn_waitlist'"),
+        _json_object_or_null(VpnWaitlist),
+        type_=JSON,
+    )
+    return (
+        select([document])
+        .select_from(
+            Email.__table__.outerjoin(AmoAccount, Email.email_id == AmoAccount.email_id)
+            .outerjoin(FirefoxAccount, Email.email_id == FirefoxAccount.email_id)
+            .outerjoin(VpnWaitlist, Email.email_id == VpnWaitlist.email_id)
+        )
+        .where(and_(*criteria))
+    )
+
+
+def get_contact_by_email_id(db: Session, email_id: UUID4) -> Optional[Dict]:
+    """
+    Get all the data for a contact.
+
+    The data is returned as nested dictionaries, in a single round trip.
+    """
+    statement = contact_document_statement(Email.email_id == email_id)
+    return db.execute(statement).scalar()
+
+
+def contact_id_criteria(
     email_id: Optional[UUID4] = None,
     primary_email: Optional[EmailStr] = None,
     basket_token: Optional[UUID4] = None,
@@ -53,8 +160,8 @@ def get_contacts_by_any_id(
     amo_user_id: Optional[str] = None,
     fxa_id: Optional[str] = None,
     fxa_primary_email: Optional[EmailStr] = None,
-) -> List[Dict]:
-    """Get all the data for multiple contacts by IDs."""
+) -> List:
+    """Return the filters for a contacts query that matches all the IDs."""
     assert any(
         (
             email_id,
@@ -67,54 +174,322 @@ def get_contacts_by_any_id(
             fxa_primary_email,
         )
     )
-    statement = (
-        db.query(Email, AmoAccount, FirefoxAccount, VpnWaitlist)
-        .outerjoin(AmoAccount, Email.email_id == AmoAccount.email_id)
-        .outerjoin(FirefoxAccount, Email.email_id == FirefoxAccount.email_id)
-        .outerjoin(VpnWaitlist, Email.email_id == VpnWaitlist.email_id)
-    )
+    criteria = []
     if email_id is not None:
-        statement = statement.filter(Email.email_id == email_id)
+        criteria.append(Email.email_id == email_id)
     if primary_email is not None:
-        statement = statement.filter(Email.primary_email == primary_email)
+        criteria.append(func.lower(Email.primary_email) == func.lower(primary_email))
     if basket_token is not None:
-        statement = statement.filter(Email.basket_token == str(basket_token))
+        criteria.append(Email.basket_token == str(basket_token))
     if sfdc_id is not None:
-        statement = statement.filter(Email.sfdc_id == sfdc_id)
+        criteria.append(Email.sfdc_id == sfdc_id)
     if mofo_id is not None:
-        statement = statement.filter(Email.mofo_id == mofo_id)
+        criteria.append(Email.mofo_id == mofo_id)
     if amo_user_id is not None:
-        statement = statement.filter(AmoAccount.user_id == amo_user_id)
+        criteria.append(AmoAccount.user_id == amo_user_id)
     if fxa_id is not None:
-        statement = statement.filter(FirefoxAccount.fxa_id == fxa_id)
+        criteria.append(FirefoxAccount.fxa_id == fxa_id)
     if fxa_primary_email is not None:
-        statement = statement.filter(FirefoxAccount.primary_email == fxa_primary_email)
-    results = statement.all()
+        criteria.append(
+            func.lower(FirefoxAccount.primary_email) == func.lower(fxa_primary_email)
+        )
+    return criteria
+
+
+def get_contact_documents_by_any_id(
+    db: Session,
+    email_id: Optional[UUID4] = None,
+    primary_email: Optional[EmailStr] = None,
+    basket_token: Optional[UUID4] = None,
+    sfdc_id: Optional[str] = None,
+    mofo_id: Optional[str] = None,
+    amo_user_id: Optional[str] = None,
+    fxa_id: Optional[str] = None,
+    fxa_primary_email: Optional[EmailStr] = None,
+) -> List[Dict]:
+    """Get the documents of the contacts matching all the IDs, in one query."""
+    criteria = contact_id_criteria(
+        email_id,
+        primary_email,
+        basket_token,
+        sfdc_id,
+        mofo_id,
+        amo_user_id,
+        fxa_id,
+        fxa_primary_email,
+    )
+    statement = contact_document_statement(*criteria)
+    return [row[0] for row in db.execute(statement)]
+
+
+def _identities_query(db: Session):
+    """Return a query of just the identity columns of contacts."""
+    return (
+        db.query(
+            Email.email_id,
+            Email.primary_email,
+            Email.basket_token,
+            Email.sfdc_id,
+            Email.mofo_id,
+            AmoAccount.user_id.label("amo_user_id"),
+            FirefoxAccount.fxa_id,
+            FirefoxAccount.primary_email.label("fxa_primary_email"),
+        )
+        .outerjoin(AmoAccount, Email.email_id == AmoAccount.email_id)
+        .outerjoin(FirefoxAccount, Email.email_id == FirefoxAccount.email_id)
+    )
+
+
+def get_identity_by_email_id(db: Session, email_id: UUID4) -> Optional[Dict]:
+    """Get the identity columns of a contact."""
+    row = _identities_query(db).filter(Email.email_id == email_id).first()
+    return row._asdict() if row else None
+
+
+def get_identities_by_any_id(
+    db: Session,
+    email_id: Optional[UUID4] = None,
+    primary_email: Optional[EmailStr] = None,
+    basket_token: Optional[UUID4] = None,
+    sfdc_id: Optional[str] = None,
+    mofo_id: Optional[str] = None,
+    amo_user_id: Optional[str] = None,
+    fxa_id: Optional[str] = None,
+    fxa_primary_email: Optional[EmailStr] = None,
+) -> List[Dict]:
+    """Get the identity columns of the contacts matching all the IDs."""
+    criteria = contact_id_criteria(
+        email_id,
+        primary_email,
+        basket_token,
+        sfdc_id,
+        mofo_id,
+        amo_user_id,
+        fxa_id,
+        fxa_primary_email,
+    )
+    rows = _identities_query(db).filter(*criteria)
+    return [row._asdict() for row in rows]
+
+
+def _contacts_query(db: Session):
+    """Return a query for contacts, joined to their one-to-one tables."""
+    return (
+        db.query(Email, AmoAccount, FirefoxAccount, VpnWaitlist)
+        .outerjoin(AmoAccount, Email.email_id == AmoAccount.email_id)
+        .outerjoin(FirefoxAccount, Email.email_id == FirefoxAccount.email_id)
+        .outerjoin(VpnWaitlist, Email.email_id == VpnWaitlist.email_id)
+    )
+
+
+def _load_contacts(db: Session, statement) -> List[Dict]:
+    """Run a contacts query, and add the newsletters in a second query."""
+    return _with_newsletters(db, statement.all())
+
+
+def _with_newsletters(db: Session, results) -> List[Dict]:
+    """Add newsletters to rows from a contacts query."""
+    newsletters = get_newsletters_by_email_ids(
+        db, [email.email_id for email, _, _, _ in results]
+    )
     data = []
     for result in results:
         email, amo, fxa, vpn_waitlist = result
-        newsletters = (
-            db.query(Newsletter).filter(Newsletter.email_id == email.email_id).all()
-        )
         data.append(
             {
                 "amo": amo,
                 "email": email,
                 "fxa": fxa,
-                "newsletters": newsletters,
+                "newsletters": newsletters.get(email.email_id, []),
                 "vpn_waitlist": vpn_waitlist,
             }
         )
     return data
 
 
+def get_contacts_by_any_id(
+    db: Session,
+    email_id: Optional[UUID4] = None,
+    primary_email: Optional[EmailStr] = None,
+    basket_token: Optional[UUID4] = None,
+    sfdc_id: Optional[str] = None,
+    mofo_id: Optional[str] = None,
+    amo_user_id: Optional[str] = None,
+    fxa_id: Optional[str] = None,
+    fxa_primary_email: Optional[EmailStr] = None,
+) -> List[Dict]:
+    """Get all the data for multiple contacts by IDs."""
+    criteria = contact_id_criteria(
+        email_id,
+        primary_email,
+        basket_token,
+        sfdc_id,
+        mofo_id,
+        amo_user_id,
+        fxa_id,
+        fxa_primary_email,
+    )
+    statement = _contacts_query(db).filter(*criteria)
+    return _load_contacts(db, statement)
+
+
+def get_contacts_by_email_ids(db: Session, email_ids: List[UUID4]) -> List[Dict]:
+    """Get all the data for multiple contacts by email_id."""
+    if not email_ids:
+        return []
+    statement = _contacts_query(db).filter(Email.email_id.in_(email_ids))
+    return _load_contacts(db, statement)
+
+
+def _contact_updated():
+    """Return the latest update_timestamp of a contact's rows."""
+    newsletters_updated = (
+        select([func.max(Newsletter.update_timestamp)])
+        .where(Newsletter.email_id == Email.email_id)
+        .as_scalar()
+    )
+    # GREATEST ignores NULLs from missing rows
+    return func.greatest(
+        Email.update_timestamp,
+        AmoAccount.update_timestamp,
+        FirefoxAccount.update_timestamp,
+        VpnWaitlist.update_timestamp,
+        newsletters_updated,
+    ).label("updated")
+
+
+def _contact_updated_query(db: Session, updated):
+    return (
+        db.query(Email.email_id, updated)
+        .outerjoin(AmoAccount, Email.email_id == AmoAccount.email_id)
+        .outerjoin(FirefoxAccount, Email.email_id == FirefoxAccount.email_id)
+        .outerjoin(VpnWaitlist, Email.email_id == VpnWaitlist.email_id)
+    )
+
+
+def get_contact_updated(db: Session, email_id: UUID4) -> Optional[datetime]:
+    """
+    Get the latest update_timestamp of a contact, without loading the contact.
+
+    Returns None for an unknown email_id.
+    """
+    row = (
+        _contact_updated_query(db, _contact_updated())
+        .filter(Email.email_id == email_id)
+        .first()
+    )
+    return row.updated if row else None
+
+
+def contact_document_updated(document: Dict) -> Optional[datetime]:
+    """Get the latest update_timestamp in a contact document."""
+    rows = [document[group] for group in ("email", "amo", "fxa", "vpn_waitlist")]
+    rows.extend(document["newsletters"])
+    timestamps = [
+        parse_datetime(row["update_timestamp"])
+        for row in rows
+        if row and row.get("update_timestamp")
+    ]
+    return max(timestamps, default=None)
+
+
+# The tables with the rows of a contact
+CONTACT_MODELS: Tuple[Any, ...] = (
+    Email,
+    AmoAccount,
+    FirefoxAccount,
+    VpnWaitlist,
+    Newsletter,
+)
+
+
+def get_contacts_updated_since(
+    db: Session,
+    since: datetime,
+    after_email_id: Optional[UUID4] = None,
+    limit: int = 100,
+) -> Tuple[List[Dict], Optional[Tuple[datetime, UUID4]]]:
+    """
+    Get contacts updated since a timestamp, ordered by (updated, email_id).
+
+    Each row update is a position (update_timestamp, email_id) in the feed,
+    so a contact changed in several tables can be in the feed more than
+    once. If after_email_id is set, the positions at exactly the timestamp
+    are skipped up to and including that email_id, for keyset pagination.
+    Each table is read in order from its (update_timestamp, email_id) index,
+    for at most limit positions, so a page costs the same at any depth.
+    Returns the contact data, once per contact, and the last position if
+    there may be more.
+
+    update_timestamp is the start time of the writing transaction, so a
+    transaction that commits late can add positions before a position
+    already returned. Readers should overlap their next reads by more than
+    the longest write transaction.
+    """
+    per_table = []
+    for model in CONTACT_MODELS:
+        position = tuple_(model.update_timestamp, model.email_id)
+        if after_email_id is None:
+            after = model.update_timestamp >= since
+        else:
+            after = position > tuple_(since, after_email_id)
+        statement = (
+            select([model.update_timestamp.label("updated"), model.email_id])
+            .where(after)
+            .order_by(model.update_timestamp, model.email_id)
+            .limit(limit)
+        )
+        if model is Newsletter:
+            # A contact's newsletters are often updated together
+            statement = statement.distinct()
+        per_table.append(select([statement.alias()]))
+    positions = union(*per_table).alias("positions")
+    page = db.execute(
+        select([positions])
+        .order_by(positions.c.updated, positions.c.email_id)
+        .limit(limit)
+    ).fetchall()
+
+    contacts = {
+        data["email"].email_id: data
+        for data in get_contacts_by_email_ids(
+            db, list({row.email_id: None for row in page})
+        )
+    }
+    # Return each contact once, at its last position in the page
+    latest = {row.email_id: row for row in page}
+    page_contacts = [
+        contacts[row.email_id] for row in page if latest[row.email_id] is row
+    ]
+    last = (page[-1].updated, page[-1].email_id) if len(page) == limit else None
+    return page_contacts, last
+
+
+def iter_contacts(db: Session, chunk_size: int = 1000) -> Iterator[List[Dict]]:
+    """
+    Get all the data for all contacts, in chunks.
+
+    The contacts are read with a server-side cursor, so only one chunk of
+    contacts is held in memory at a time.
+    """
+    query = (
+        _contacts_query(db).execution_options(stream_results=True).yield_per(chunk_size)
+    )
+    results = iter(query)
+    while True:
+        chunk = list(islice(results, chunk_size))
+        if not chunk:
+            return
+        yield _with_newsletters(db, chunk)
+
+
 def create_amo(db: Session, email_id: UUID4, amo: AddOnsSchema):
     db_amo = AmoAccount(email_id=email_id, **amo.dict())
     db.add(db_amo)
 
 
-def create_email(db: Session, email: EmailInSchema):
-    db_email = Email(**email.dict())
+def create_email(db: Session, email: EmailInSchema, content_hash: Optional[str] = None):
+    db_email = Email(**{**email.dict(), "content_hash": content_hash})
     db.add(db_email)
 
 
@@ -134,7 +509,7 @@ def create_newsletter(db: Session, email_id: UUID4, newsletter: NewsletterSchema
 
 
 def create_contact(db: Session, email_id: UUID4, contact: ContactInSchema):
-    create_email(db, contact.email)
+    create_email(db, contact.email, contact_content_hash(contact))
     if contact.amo:
         create_amo(db, email_id, contact.amo)
     if contact.fxa:
@@ -143,3 +518,320 @@ def create_contact(db: Session, email_id: UUID4, contact: ContactInSchema):
         create_vpn_waitlist(db, email_id, contact.vpn_waitlist)
     for newsletter in contact.newsletters:
         create_newsletter(db, email_id, newsletter)
+
+
+def contact_content_hash(contact: ContactInSchema) -> str:
+    """
+    Return a hash of the contact data, excluding timestamps.
+
+    The same contact data always has the same hash, so comparing hashes
+    tells if a contact has changed. The email_id must be set.
+    """
+    # Hash only the fields callers provide, even for a ContactSchema
+    if type(contact) is not ContactInSchema:
+        contact = ContactInSchema(**contact.dict())
+    data = contact.dict(exclude={"amo": {"create_timestamp", "update_timestamp"}})
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return sha256(canonical.encode("utf8")).hexdigest()
+
+
+def get_content_hashes(
+    db: Session,
+    email_ids: List[UUID4],
+    expected: Optional[Dict[UUID4, str]] = None,
+) -> Dict[UUID4, Optional[str]]:
+    """
+    Get the content hashes of existing contacts, keyed by email_id.
+
+    If expected hashes are given, a stored hash that differs is recomputed
+    from the contact's data, since it may be from older schemas, like before
+    a field with a default was added.
+    """
+    rows = db.query(Email.email_id, Email.content_hash).filter(
+        Email.email_id.in_(email_ids)
+    )
+    hashes = {row.email_id: row.content_hash for row in rows}
+    # Contacts without a hash, or with one from older schemas, are hashed
+    # from their data
+    unhashed = [
+        email_id
+        for email_id, content_hash in hashes.items()
+        if not content_hash or (expected and content_hash != expected.get(email_id))
+    ]
+    if unhashed:
+        for data in get_contacts_by_email_ids(db, unhashed):
+            contact = ContactInSchema(**data)
+            hashes[contact.email.email_id] = contact_content_hash(contact)
+    return hashes
+
+
+def insert_statement(model, rows: List[Dict]):
+    """Return a multi-row INSERT for a table."""
+    for row in rows:
+        # Let the database set timestamps that weren't provided
+        for timestamp in ("create_timestamp", "update_timestamp"):
+            if timestamp in row and row[timestamp] is None:
+                row[timestamp] = func.now()
+    return insert(model.__table__).values(rows)
+
+
+def satellite_rows(email_id: UUID4, contact: ContactInSchema) -> Dict[Any, List[Dict]]:
+    """Return the rows to insert for a contact, by model, except the emails row."""
+    rows: Dict[Any, List[Dict]] = {
+        AmoAccount: [],
+        FirefoxAccount: [],
+        VpnWaitlist: [],
+        Newsletter: [],
+    }
+    if contact.amo:
+        rows[AmoAccount].append({"email_id": email_id, **contact.amo.dict()})
+    if contact.fxa:
+        rows[FirefoxAccount].append({"email_id": email_id, **contact.fxa.dict()})
+    if contact.vpn_waitlist:
+        rows[VpnWaitlist].append({"email_id": email_id, **contact.vpn_waitlist.dict()})
+    for newsletter in contact.newsletters:
+        rows[Newsletter].append({"email_id": email_id, **newsletter.dict()})
+    return rows
+
+
+def contact_rows(email_id: UUID4, contact: ContactInSchema) -> Dict[Any, List[Dict]]:
+    """Return the rows to insert for a contact, by model."""
+    email_row = {**contact.email.dict(), "content_hash": contact_content_hash(contact)}
+    return {Email: [email_row], **satellite_rows(email_id, contact)}
+
+
+def create_contacts(db: Session, contacts: List[ContactInSchema]) -> Set[UUID4]:
+    """
+    Create many contacts, with one multi-row INSERT per table.
+
+    The email_id must be set on each contact. Contacts that collide with an
+    existing email_id, primary_email, basket_token or fxa_id (or an earlier
+    contact in the same batch), or that repeat a newsletter, are skipped.
+    Returns the email_ids of the created contacts.
+    """
+    unique_contacts: Dict[UUID4, ContactInSchema] = {}
+    for contact in contacts:
+        unique_contacts.setdefault(contact.email.email_id, contact)
+    if not unique_contacts:
+        return set()
+    statement = (
+        insert(Email.__table__)
+        .values(
+            [
+                {**contact.email.dict(), "content_hash": contact_content_hash(contact)}
+                for contact in unique_contacts.values()
+            ]
+        )
+        .on_conflict_do_nothing()
+        .returning(Email.email_id)
+    )
+    created = {row.email_id for row in db.execute(statement)}
+
+    rows_by_model: Dict[Any, List[Dict]] = {
+        AmoAccount: [],
+        FirefoxAccount: [],
+        VpnWaitlist: [],
+        Newsletter: [],
+    }
+    for email_id, contact in unique_contacts.items():
+        if email_id in created:
+            for model, rows in satellite_rows(email_id, contact).items():
+                rows_by_model[model].extend(rows)
+    collided: Set[UUID4] = set()
+    for model, rows in rows_by_model.items():
+        if rows:
+            expected = Counter(row["email_id"] for row in rows)
+            statement = (
+                insert_statement(model, rows)
+                .on_conflict_do_nothing()
+                .returning(model.email_id)
+            )
+            inserted = Counter(row.email_id for row in db.execute(statement))
+            collided.update(
+                email_id
+                for email_id, count in expected.items()
+                if inserted[email_id] < count
+            )
+    if collided:
+        # Remove the contacts with a skipped row, so none is half-created
+        for model in (Newsletter, AmoAccount, FirefoxAccount, VpnWaitlist, Email):
+            db.execute(delete(model.__table__).where(model.email_id.in_(collided)))
+        created -= collided
+    return created
+
+
+# Groups with one row per contact, as (model, schema)
+SINGLE_GROUPS: Dict[str, Tuple[Any, Type[BaseModel]]] = {
+    "amo": (AmoAccount, AddOnsSchema),
+    "fxa": (FirefoxAccount, FirefoxAccountsSchema),
+    "vpn_waitlist": (VpnWaitlist, VpnWaitlistSchema),
+}
+# Timestamps are set by the database, not by updates
+TIMESTAMP_FIELDS = {"create_timestamp", "update_timestamp"}
+
+
+def update_contact(
+    db: Session, email_id: UUID4, patch: ContactPatchSchema
+) -> Optional[Dict]:
+    """
+    Apply a partial update to a contact, without loading it first.
+
+    Only the groups and fields set in the patch are written, and their
+    update_timestamp is set to now(). The email row is updated or locked
+    first, so concurrent updates of a contact are serialized. Returns the
+    updated contact document, or None if the contact was not found.
+    """
+    email_fields = patch.email.dict(exclude_unset=True) if patch.email else {}
+    if email_fields:
+        statement = (
+            update(Email.__table__)
+            .where(Email.email_id == email_id)
+            .values(**email_fields, update_timestamp=func.now())
+        )
+        if db.execute(statement).rowcount == 0:
+            return None
+    else:
+        locked = (
+            db.query(Email.email_id)
+            .filter(Email.email_id == email_id)
+            .with_for_update()
+            .first()
+        )
+        if locked is None:
+            return None
+
+    for group, (model, schema) in SINGLE_GROUPS.items():
+        value = getattr(patch, group)
+        if value is None:
+            continue
+        fields = value.dict(exclude_unset=True, exclude=TIMESTAMP_FIELDS)
+        # A missing group is created with the defaults for unset fields
+        row = schema(**fields).dict(exclude=TIMESTAMP_FIELDS)
+        statement = (
+            insert(model.__table__)
+            .values(email_id=email_id, **row)
+            .on_conflict_do_update(
+                index_elements=[model.email_id],
+                set_={**fields, "update_timestamp": func.now()},
+            )
+        )
+        db.execute(statement)
+
+    # One upsert for the newsletters that set the same fields
+    upserts: Dict[Tuple[str, ...], List[Dict]] = {}
+    for newsletter in {nl.name: nl for nl in patch.newsletters}.values():
+        fields = tuple(sorted(newsletter.dict(exclude_unset=True)))
+        upserts.setdefault(fields, []).append(
+            {"email_id": email_id, **newsletter.dict()}
+        )
+    for fields, rows in upserts.items():
+        statement = insert(Newsletter.__table__).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[Newsletter.email_id, Newsletter.name],
+            set_={
+                **{key: statement.excluded[key] for key in fields},
+                "update_timestamp": func.now(),
+            },
+        )
+        db.execute(statement)
+
+    document = get_contact_by_email_id(db, email_id)
+    content_hash = contact_content_hash(ContactInSchema(**document))
+    # The email row's timestamp changes with the hash, for its ETag
+    updated = db.execute(
+        update(Email.__table__)
+        .where(Email.email_id == email_id)
+        .where(Email.content_hash.is_distinct_from(content_hash))
+        .values(content_hash=content_hash, update_timestamp=func.now())
+        .returning(Email.update_timestamp)
+    ).scalar()
+    document["email"]["content_hash"] = content_hash
+    if updated is not None:
+        document["email"]["update_timestamp"] = updated.isoformat()
+    return document
+
+
+def update_newsletter_subscriptions(
+    db: Session,
+    name: str,
+    fields: Dict[str, Any],
+    email_ids: List[UUID4],
+    basket_tokens: List[UUID4],
+) -> List[Tuple[UUID4, Optional[str], bool]]:
+    """
+    Set the state of a newsletter for many contacts, in one statement.
+
+    fields are the newsletter fields to set, including subscribed. When
+    subscribing, missing newsletter rows are created by an upsert on
+    (email_id, name). When unsubscribing, only existing rows are updated.
+    Rows that already have the state are not written. Changed contacts get a
+    NULL content_hash, to be recomputed from their data, and a new email
+    update_timestamp. Returns (email_id, basket_token, changed) for each
+    contact found.
+    """
+    targets = (
+        select([Email.email_id, Email.basket_token])
+        .where(
+            or_(
+                Email.email_id == any_(cast(email_ids, ARRAY(PG_UUID(as_uuid=True)))),
+                Email.basket_token
+                == any_(cast([str(token) for token in basket_tokens], ARRAY(String))),
+            )
+        )
+        .cte("targets")
+    )
+    columns = Newsletter.__table__.c
+    if fields["subscribed"]:
+        row = NewsletterSchema(name=name, **fields).dict()
+        upsert = insert(Newsletter.__table__).from_select(
+            ["email_id", *row],
+            select(
+                [
+                    targets.c.email_id,
+                    *(literal(value, columns[key].type) for key, value in row.items()),
+                ]
+            ),
+        )
+        changed = upsert.on_conflict_do_update(
+            index_elements=[Newsletter.email_id, Newsletter.name],
+            set_={
+                **{key: upsert.excluded[key] for key in fields},
+                "update_timestamp": func.now(),
+            },
+            where=or_(
+                *(columns[key].is_distinct_from(upsert.excluded[key]) for key in fields)
+            ),
+        )
+    else:
+        changed = (
+            update(Newsletter.__table__)
+            .where(Newsletter.email_id == targets.c.email_id)
+            .where(Newsletter.name == name)
+            .where(
+                or_(
+                    *(
+                        columns[key].is_distinct_from(literal(value, columns[key].type))
+                        for key, value in fields.items()
+                    )
+                )
+            )
+            .values(**fields, update_timestamp=func.now())
+        )
+    changed = changed.returning(Newsletter.email_id).cte("changed")
+    hashed = (
+        update(Email.__table__)
+        .where(Email.email_id.in_(select([changed.c.email_id])))
+        .values(content_hash=None, update_timestamp=func.now())
+        .returning(Email.email_id)
+        .cte("hashed")
+    )
+    statement = select(
+        [
+            targets.c.email_id,
+            targets.c.basket_token,
+            hashed.c.email_id.isnot(None).label("changed"),
+        ]
+    ).select_from(targets.outerjoin(hashed, hashed.c.email_id == targets.c.email_id))
+    return [
+        (row.email_id, row.basket_token, row.changed) for row in db.execute(statement)
+    ]
@@ -1,16 +1,192 @@
 import os
+from threading import Lock
+from time import perf_counter
+from typing import Dict, Optional, Tuple
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool, QueuePool
 
 from . import config
+from .metrics import (
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_CHECKOUTS,
+    DB_POOL_CONNECTS,
+    DB_POOL_OVERFLOW_CHECKOUTS,
+    DB_POOL_TIMEOUTS,
+    DB_POOL_WAIT,
+    record_query,
+)
 
+try:
+    import asyncpg
+except ImportError:  # pragma: no cover
+    asyncpg = None
 
-def get_db_engine(settings: config.Settings):
-    engine = create_engine(settings.db_url)
+
+class PoolMetrics:
+    """Connection pool counters, to help size the pool."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connects = 0
+            self.checkouts = 0
+            self.checkins = 0
+            self.timeouts = 0
+            self.wait_seconds = 0.0
+            self.max_wait_seconds = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        DB_POOL_WAIT.observe(seconds)
+        if timed_out:
+            DB_POOL_TIMEOUTS.inc()
+        with self._lock:
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "checked_out": self.checkouts - self.checkins,
+                "timeouts": self.timeouts,
+                "wait_seconds": self.wait_seconds,
+                "max_wait_seconds": self.max_wait_seconds,
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class MeteredQueuePool(QueuePool):
+    """A QueuePool that records the time spent waiting for a connection."""
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.record_wait(perf_counter() - start, timed_out=True)
+            raise
+        pool_metrics.record_wait(perf_counter() - start)
+        return connection
+
+
+def instrument_engine(engine):
+    """Count and time the SQL statements sent through an engine."""
+
+    def before_cursor_execute(conn, *args):
+        conn.info.setdefault("query_start", []).append(perf_counter())
+
+    def after_cursor_execute(conn, *args):
+        record_query(perf_counter() - conn.info["query_start"].pop())
+
+    def handle_error(context):
+        # A failed statement has no after_cursor_execute
+        if context.connection is not None and context.connection.info.get(
+            "query_start"
+        ):
+            context.connection.info["query_start"].pop()
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
+
+
+def pool_sizes(settings: config.Settings, for_async=False) -> Tuple[int, int]:
+    """
+    Return the pool size and max overflow for the sync or the async pool.
+
+    With use_async_db, the two pools split db_pool_size and db_max_overflow,
+    so a worker doesn't open more connections than without it.
+    """
+    size, overflow = settings.db_pool_size, settings.db_max_overflow
+    if not settings.use_async_db:
+        return size, overflow
+    async_size, async_overflow = size // 2, overflow // 2
+    if for_async:
+        return async_size, async_overflow
+    return size - async_size, overflow - async_overflow
+
+
+def get_db_engine(settings: config.Settings, db_url: Optional[str] = None):
+    """Create the engine and sessionmaker, for db_url or the primary database."""
+    db_url = db_url or settings.db_url
+    if settings.db_external_pooler:
+        # Each session gets a new connection from the external pooler, and
+        # closes it when done, so no state is carried between transactions.
+        engine = create_engine(db_url, poolclass=NullPool)
+    else:
+        pool_size, max_overflow = pool_sizes(settings)
+        engine = create_engine(
+            db_url,
+            poolclass=MeteredQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_pre_ping=settings.db_pool_pre_ping,
+            pool_recycle=settings.db_pool_recycle,
+        )
+    pool = engine.pool
+
+    def on_connect(*args):
+        pool_metrics.count("connects")
+        DB_POOL_CONNECTS.inc()
+
+    def on_checkout(*args):
+        pool_metrics.count("checkouts")
+        DB_POOL_CHECKOUTS.inc()
+        DB_POOL_CHECKED_OUT.inc()
+        if isinstance(pool, QueuePool) and pool.overflow() > 0:
+            DB_POOL_OVERFLOW_CHECKOUTS.inc()
+
+    def on_checkin(*args):
+        pool_metrics.count("checkins")
+        DB_POOL_CHECKED_OUT.dec()
+
+    event.listen(engine, "connect", on_connect)
+    event.listen(engine, "checkout", on_checkout)
+    event.listen(engine, "checkin", on_checkin)
+    instrument_engine(engine)
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     return engine, SessionLocal
 
 
+async def get_async_db_pool(settings: config.Settings):
+    """Create an asyncpg connection pool, for the async endpoints."""
+    if asyncpg is None:
+        raise RuntimeError("CTMS_USE_ASYNC_DB requires the asyncpg package")
+    pool_size, max_overflow = pool_sizes(settings, for_async=True)
+    if settings.db_external_pooler:
+        # asyncpg always pools, so keep no idle connections, and use unnamed
+        # statements that don't outlive the transaction.
+        return await asyncpg.create_pool(
+            settings.db_url,
+            min_size=0,
+            max_size=pool_size + max_overflow,
+            max_inactive_connection_lifetime=1,
+            statement_cache_size=0,
+        )
+    return await asyncpg.create_pool(
+        settings.db_url,
+        min_size=pool_size,
+        max_size=pool_size + max_overflow,
+        statement_cache_size=settings.db_statement_cache_size,
+    )
+
+
 Base = declarative_base()
@@ -0,0 +1,183 @@
+"""
+Prometheus metrics for the API.
+
+Under gunicorn, set the prometheus_multiproc_dir environment variable to an
+empty directory, so that each worker process writes its metrics there and
+/metrics reports the totals for all workers.
+
+The SQL statements of each request are also counted and timed, and reported
+in the Server-Timing response header.
+"""
+import os
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Optional
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    multiprocess,
+)
+from starlette.routing import Match
+
+# Request latency buckets, in seconds, with detail for cached responses
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+REQUESTS = Counter(
+    "ctms_requests_total",
+    "Requests by route template and status code",
+    ["method", "path_template", "status_code"],
+)
+REQUEST_DURATION = Histogram(
+    "ctms_request_duration_seconds",
+    "Request duration by route template",
+    ["method", "path_template"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_CONNECTS = Counter(
+    "ctms_db_pool_connects_total", "New database connections made by the pool"
+)
+DB_POOL_CHECKOUTS = Counter(
+    "ctms_db_pool_checkouts_total", "Database connections checked out of the pool"
+)
+DB_POOL_OVERFLOW_CHECKOUTS = Counter(
+    "ctms_db_pool_overflow_checkouts_total",
+    "Checkouts while the pool had more connections than pool_size",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "ctms_db_pool_checked_out",
+    "Database connections currently checked out",
+    multiprocess_mode="livesum",
+)
+DB_POOL_TIMEOUTS = Counter(
+    "ctms_db_pool_timeouts_total", "Timeouts waiting for a pool connection"
+)
+DB_POOL_WAIT = Histogram(
+    "ctms_db_pool_wait_seconds",
+    "Time waiting for a pool connection",
+    buckets=LATENCY_BUCKETS,
+)
+DB_QUERIES = Counter("ctms_db_queries_total", "SQL statements sent to the database")
+DB_QUERY_DURATION = Histogram(
+    "ctms_db_query_duration_seconds",
+    "Duration of SQL statements",
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    "ctms_request_db_queries",
+    "SQL statements per request, by route template",
+    ["method", "path_template"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+
+
+class QueryStats:
+    """The number and duration of the SQL statements for a request."""
+
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def server_timing(self) -> bytes:
+        """Return a Server-Timing header value, with the time in milliseconds."""
+        return f'db;desc="{self.count} queries";dur={self.seconds * 1000:.3f}'.encode()
+
+
+# The stats for the current request. Sync endpoints run in a copy of the
+# request's context, so they update the same QueryStats.
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar(
+    "current_query_stats", default=None
+)
+
+
+def record_query(seconds: float):
+    """Record a SQL statement, for the metrics and the current request."""
+    DB_QUERIES.inc()
+    DB_QUERY_DURATION.observe(seconds)
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += seconds
+
+
+def get_registry() -> CollectorRegistry:
+    """Return the registry to report, combining worker processes if needed."""
+    if "prometheus_multiproc_dir" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def route_template(scope) -> str:
+    """Return the path template of the route for a request."""
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    # Unknown paths share a label, to limit the number of time series
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that records the count and duration of requests.
+
+    The SQL statements made before the response starts are reported in the
+    Server-Timing header. All of them, including those made while streaming
+    the response, are counted in the metrics.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        start = perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = [
+                    *message["headers"],
+                    (b"server-timing", stats.server_timing()),
+                ]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = perf_counter() - start
+            current_query_stats.reset(token)
+            method = scope["method"]
+            path_template = route_template(scope)
+            REQUESTS.labels(method, path_template, status_code).inc()
+            REQUEST_DURATION.labels(method, path_template).observe(duration)
+            REQUEST_QUERIES.labels(method, path_template).observe(stats.count)
@@ -4,14 +4,14 @@ from sqlalchemy import (
     Column,
     Date,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
-    UniqueConstraint,
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql.functions import now
+from sqlalchemy.sql.functions import func, now
 
 from .database import Base
 
@@ -20,10 +20,10 @@ class Email(Base):
     __tablename__ = "emails"
 
     email_id = Column(UUID(as_uuid=True), primary_key=True)
-    primary_email = Column(String(255), unique=True, nullable=False)
+    primary_email = Column(String(255), nullable=False)
     basket_token = Column(String(255), unique=True)
-    sfdc_id = Column(String(255))
-    mofo_id = Column(String(255))
+    sfdc_id = Column(String(255), index=True)
+    mofo_id = Column(String(255), index=True)
     first_name = Column(String(255))
     last_name = Column(String(255))
     mailing_country = Column(String(255))
@@ -33,6 +33,8 @@ class Email(Base):
     double_opt_in = Column(Boolean)
     has_opted_out_of_email = Column(Boolean)
     unsubscribe_reason = Column(Text)
+    # SHA-256 of the contact data, see crud.contact_content_hash
+    content_hash = Column(String(64))
 
     create_timestamp = Column(
         TIMESTAMP(timezone=True), nullable=False, server_default=now()
@@ -49,6 +51,12 @@ class Email(Base):
     amo = relationship("AmoAccount", back_populates="email", uselist=False)
     vpn_waitlist = relationship("VpnWaitlist", back_populates="email", uselist=False)
 
+    # Emails are unique and looked up regardless of case
+    __table_args__ = (
+        Index("ix_emails_primary_email_lower", func.lower(primary_email), unique=True),
+        Index("ix_emails_update_timestamp_email_id", update_timestamp, email_id),
+    )
+
 
 class Newsletter(Base):
     __tablename__ = "newsletters"
@@ -74,7 +82,12 @@ class Newsletter(Base):
 
     email = relationship("Email", back_populates="newsletters", uselist=False)
 
-    UniqueConstraint("email_id", "name", name="uix_email_name")
+    # A contact has one row per newsletter. The index also serves lookups by
+    # email_id, and is the conflict target for newsletter upserts.
+    __table_args__ = (
+        Index("uix_email_name", email_id, name, unique=True),
+        Index("ix_newsletters_update_timestamp_email_id", update_timestamp, email_id),
+    )
 
 
 class FirefoxAccount(Base):
@@ -103,6 +116,11 @@ class FirefoxAccount(Base):
 
     email = relationship("Email", back_populates="fxa", uselist=False)
 
+    __table_args__ = (
+        Index("ix_fxa_primary_email_lower", func.lower(primary_email)),
+        Index("ix_fxa_update_timestamp_email_id", update_timestamp, email_id),
+    )
+
 
 class AmoAccount(Base):
     __tablename__ = "amo"
@@ -119,7 +137,7 @@ class AmoAccount(Base):
     location = Column(String(10))
     profile_url = Column(String(40))
     user = Column(Boolean)
-    user_id = Column(String(40))
+    user_id = Column(String(40), index=True)
     username = Column(String(100))
 
     create_timestamp = Column(
@@ -134,6 +152,10 @@ class AmoAccount(Base):
 
     email = relationship("Email", back_populates="amo", uselist=False)
 
+    __table_args__ = (
+        Index("ix_amo_update_timestamp_email_id", update_timestamp, email_id),
+    )
+
 
 class VpnWaitlist(Base):
     __tablename__ = "vpn_waitlist"
@@ -156,3 +178,7 @@ class VpnWaitlist(Base):
     )
 
     email = relationship("Email", back_populates="vpn_waitlist", uselist=False)
+
+    __table_args__ = (
+        Index("ix_vpn_waitlist_update_timestamp_email_id", update_timestamp, email_id),
+    )
@@ -0,0 +1,22 @@
+"""JSON encoding for responses, with orjson."""
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+def dump_json(data: Any) -> bytes:
+    """
+    Serialize data for a response.
+
+    The data can contain UUIDs, dates and datetimes, as from a pydantic
+    model's dict().
+    """
+    return orjson.dumps(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """A JSONResponse that uses dump_json."""
+
+    def render(self, content: Any) -> bytes:
+        return dump_json(content)
@@ -1,7 +1,19 @@
 from .addons import AddOnsSchema
-from .contact import ContactInSchema, ContactSchema, CTMSResponse, IdentityResponse
-from .email import EmailInSchema, EmailSchema
+from .contact import (
+    ContactBatchRequest,
+    ContactBatchResponse,
+    ContactBulkRequest,
+    ContactBulkResponse,
+    ContactBulkResult,
+    ContactInSchema,
+    ContactPatchSchema,
+    ContactSchema,
+    ContactUpdatesResponse,
+    CTMSResponse,
+    IdentityResponse,
+)
+from .email import EmailInSchema, EmailPatchSchema, EmailSchema
 from .fxa import FirefoxAccountsSchema
-from .newsletter import NewsletterSchema
+from .newsletter import NewsletterBulkRequest, NewsletterBulkResponse, NewsletterSchema
 from .vpn import VpnWaitlistSchema
 from .web import BadRequestResponse, NotFoundResponse
@@ -5,7 +5,7 @@ from uuid import UUID
 from pydantic import UUID4, BaseModel, EmailStr, Field, HttpUrl
 
 from .addons import AddOnsSchema
-from .email import EmailInSchema, EmailSchema
+from .email import EmailInSchema, EmailPatchSchema, EmailSchema
 from .fxa import FirefoxAccountsSchema
 from .newsletter import NewsletterSchema
 from .vpn import VpnWaitlistSchema
@@ -52,6 +52,25 @@ class ContactInSchema(BaseModel):
     vpn_waitlist: Optional["VpnWaitlistSchema"] = None
 
 
+class ContactPatchSchema(BaseModel):
+    """
+    A partial update to a contact, for PATCH /ctms/<email_id>
+
+    Only the groups and fields that are set are changed. Newsletters are
+    matched by name, and newsletters that are not included are unchanged.
+    """
+
+    amo: Optional[AddOnsSchema] = None
+    email: Optional[EmailPatchSchema] = None
+    fxa: Optional[FirefoxAccountsSchema] = None
+    newsletters: List[NewsletterSchema] = Field(
+        default=[],
+        description="Newsletters to add or change",
+        example=([{"name": "firefox-welcome", "subscribed": False}]),
+    )
+    vpn_waitlist: Optional[VpnWaitlistSchema] = None
+
+
 class CTMSResponse(BaseModel):
     """
     Response for /ctms/<email_id>
@@ -80,3 +99,77 @@ class IdentityResponse(BaseModel):
     amo_user_id: Optional[str] = None
     fxa_id: Optional[str] = None
     fxa_primary_email: Optional[EmailStr] = None
+
+
+class ContactBatchRequest(BaseModel):
+    """Request for POST /ctms/batch"""
+
+    email_ids: List[UUID] = Field(
+        ...,
+        max_items=1000,
+        description="The email_ids of up to 1000 contacts",
+        example=[
+            "332de237-cab7-4461-bcc3-48e68f42bd5c",
+            "cad092ec-a71a-4df5-aa92-517959caeecb",
+        ],
+    )
+
+
+class ContactBatchResponse(BaseModel):
+    """Response for POST /ctms/batch"""
+
+    contacts: List[ContactSchema] = Field(
+        ..., description="The contacts that were found"
+    )
+    not_found: List[UUID] = Field(
+        ...,
+        description="The requested email_ids that were not found",
+        example=["cad092ec-a71a-4df5-aa92-517959caeecb"],
+    )
+
+
+class ContactBulkRequest(BaseModel):
+    """Request for POST /ctms/bulk"""
+
+    contacts: List[ContactInSchema] = Field(
+        ..., max_items=1000, description="Up to 1000 contacts to create"
+    )
+
+
+class ContactBulkResult(BaseModel):
+    """The outcome of creating one contact in POST /ctms/bulk"""
+
+    email_id: UUID = Field(
+        ...,
+        description="ID for email, generated if not provided",
+        example="332de237-cab7-4461-bcc3-48e68f42bd5c",
+    )
+    status: Literal["created", "exists", "conflict"] = Field(
+        ...,
+        description=(
+            "created for a new contact, exists if an identical contact was"
+            " already created, conflict if it collides with a different contact"
+        ),
+        example="created",
+    )
+
+
+class ContactBulkResponse(BaseModel):
+    """Response for POST /ctms/bulk"""
+
+    results: List[ContactBulkResult] = Field(
+        ..., description="The outcome for each contact, in request order"
+    )
+
+
+class ContactUpdatesResponse(BaseModel):
+    """Response for GET /updates"""
+
+    contacts: List[ContactSchema] = Field(
+        ...,
+        description="Contacts updated since the requested time, oldest update first",
+    )
+    next_cursor: Optional[str] = Field(
+        default=None,
+        description="Pass as cursor to get the next page, null on the last page",
+    )
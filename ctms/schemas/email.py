@@ -2,7 +2,7 @@ from datetime import date, datetime
 from typing import Any, Dict, List, Literal, Optional
 from uuid import UUID, uuid4
 
-from pydantic import UUID4, BaseModel, EmailStr, Field, HttpUrl
+from pydantic import UUID4, BaseModel, EmailStr, Field, HttpUrl, validator
 
 email_id_field: UUID4 = Field(
     description="ID for email",
@@ -92,6 +92,15 @@ class EmailSchema(EmailBase):
         description="Contact last modified date, LastModifiedDate in Salesforce",
         example="2021-01-28T21:26:57.511Z",
     )
+    content_hash: Optional[str] = Field(
+        default=None,
+        description=(
+            "SHA-256 of the contact data, to tell if it has changed. Null if"
+            " not computed since the last bulk newsletter change, or since"
+            " content hashes were added."
+        ),
+        example="7c62e8fd0f1d4f96a1e9cd6e6b4e0fa5a3c7dc1e0d8f2b7b5c3e5f0a9e1d2c4b",  # pragma: allowlist secret
+    )
 
     # TODO: Is overriding equality the best way
     #       to add this specific comparison or should
@@ -105,7 +114,11 @@ class EmailSchema(EmailBase):
         # for comparison in most cases. Check directly
         # that these fields are equivalent if you want
         # to do that
-        excluded_in_comparison = {"create_timestamp", "update_timestamp"}
+        excluded_in_comparison = {
+            "create_timestamp",
+            "update_timestamp",
+            "content_hash",
+        }
 
         return self.dict(exclude=excluded_in_comparison) == other.dict(
             exclude=excluded_in_comparison
@@ -124,3 +137,25 @@ class EmailInSchema(EmailBase):
         if self.email_id is None or other.email_id is None:
             raise BaseException("Cannot compare Email instances without email_id")
         return super().__eq__(self, other)
+
+
+class EmailPatchSchema(EmailBase):
+    """Email data for a partial update, where every field is optional."""
+
+    primary_email: Optional[EmailStr] = Field(
+        default=None,
+        description="Contact email address, Email in Salesforce",
+        example="contact@example.com",
+    )
+    basket_token: Optional[UUID] = Field(
+        default=None,
+        description="Basket token, Token__c in Salesforce",
+        example="c4a7d759-bb52-457b-896b-90f1d3ef8433",
+    )
+
+    @validator("primary_email", pre=True)
+    def primary_email_is_required(cls, value):
+        # Omit primary_email to keep it, it can't be removed
+        if value is None:
+            raise ValueError("primary_email can not be null")
+        return value
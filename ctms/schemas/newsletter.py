@@ -35,3 +35,41 @@ class NewsletterSchema(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class NewsletterBulkRequest(NewsletterSchema):
+    """
+    Request for POST /newsletters/bulk
+
+    The newsletter state is set for the contacts identified by email_id or
+    basket_token. Unset fields keep their current value, or their default
+    for new subscriptions.
+    """
+
+    email_ids: List[UUID] = Field(
+        default=[],
+        max_items=100000,
+        description="The email_ids of the contacts",
+        example=["332de237-cab7-4461-bcc3-48e68f42bd5c"],
+    )
+    basket_tokens: List[UUID] = Field(
+        default=[],
+        max_items=100000,
+        description="The basket tokens of the contacts",
+        example=["c4a7d759-bb52-457b-896b-90f1d3ef8433"],
+    )
+
+
+class NewsletterBulkResponse(BaseModel):
+    """Response for POST /newsletters/bulk"""
+
+    updated: int = Field(
+        ...,
+        description="The number of contacts with a changed subscription",
+        example=1,
+    )
+    not_found: List[UUID] = Field(
+        ...,
+        description="The requested email_ids and basket tokens with no contact",
+        example=["cad092ec-a71a-4df5-aa92-517959caeecb"],
+    )
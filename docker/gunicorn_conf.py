@@ -42,3 +42,23 @@ log_data = {
     "port": port,
 }
 print(json.dumps(log_data))
+
+
+def on_starting(server):
+    """Start with an empty shared response cache, in case the data format changed."""
+    shared_cache_path = os.getenv("CTMS_SHARED_CACHE_PATH")
+    if shared_cache_path and os.path.exists(shared_cache_path):
+        os.unlink(shared_cache_path)
+    # Start with no metrics from previous runs
+    metrics_dir = os.getenv("prometheus_multiproc_dir")
+    if metrics_dir and os.path.isdir(metrics_dir):
+        for name in os.listdir(metrics_dir):
+            os.unlink(os.path.join(metrics_dir, name))
+
+
+def child_exit(server, worker):
+    """Remove the live gauges of an exited worker from the metrics."""
+    if os.getenv("prometheus_multiproc_dir"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
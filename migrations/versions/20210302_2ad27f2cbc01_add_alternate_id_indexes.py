@@ -0,0 +1,44 @@
+"""Add indexes for alternate IDs
+
+Revision ID: 2ad27f2cbc01
+Revises: 20f05b0d3dc8
+Create Date: 2021-03-02 11:12:40.315217
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "2ad27f2cbc01"  # pragma: allowlist secret
+down_revision = "20f05b0d3dc8"  # pragma: allowlist secret
+branch_labels = None
+depends_on = None
+
+# (index name, table, column) for the lookups in /ctms and /identities
+INDEXES = (
+    ("ix_emails_sfdc_id", "emails", "sfdc_id"),
+    ("ix_emails_mofo_id", "emails", "mofo_id"),
+    ("ix_amo_user_id", "amo", "user_id"),
+    ("ix_fxa_primary_email", "fxa", "primary_email"),
+    ("ix_newsletters_email_id", "newsletters", "email_id"),
+)
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY can't run in a transaction, but doesn't lock
+    # the tables against writes while the index is built.
+    with op.get_context().autocommit_block():
+        for name, table, column in INDEXES:
+            op.create_index(
+                name,
+                table,
+                [column],
+                unique=False,
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, column in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
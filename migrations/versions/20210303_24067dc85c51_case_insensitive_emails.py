@@ -0,0 +1,61 @@
+"""Case-insensitive email indexes
+
+Revision ID: 24067dc85c51
+Revises: 2ad27f2cbc01
+Create Date: 2021-03-03 09:41:17.582093
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "24067dc85c51"  # pragma: allowlist secret
+down_revision = "2ad27f2cbc01"  # pragma: allowlist secret
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # This fails if there are existing emails that differ only by case,
+    # which need to be merged first.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_emails_primary_email_lower",
+            "emails",
+            [sa.text("lower(primary_email)")],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_fxa_primary_email_lower",
+            "fxa",
+            [sa.text("lower(primary_email)")],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_fxa_primary_email", table_name="fxa", postgresql_concurrently=True
+        )
+    op.drop_constraint("emails_primary_email_key", "emails", type_="unique")
+
+
+def downgrade():
+    op.create_unique_constraint("emails_primary_email_key", "emails", ["primary_email"])
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_fxa_primary_email",
+            "fxa",
+            ["primary_email"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_fxa_primary_email_lower",
+            table_name="fxa",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_emails_primary_email_lower",
+            table_name="emails",
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,41 @@
+"""Add indexes for update timestamps
+
+Revision ID: e43e49174162
+Revises: 24067dc85c51
+Create Date: 2021-03-04 14:02:51.734462
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e43e49174162"  # pragma: allowlist secret
+down_revision = "24067dc85c51"  # pragma: allowlist secret
+branch_labels = None
+depends_on = None
+
+TABLES = ("emails", "amo", "fxa", "newsletters", "vpn_waitlist")
+
+
+def upgrade():
+    # The updates feed pages over (update_timestamp, email_id) in each table,
+    # which these indexes read in order.
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.create_index(
+                f"ix_{table}_update_timestamp_email_id",
+                table,
+                ["update_timestamp", "email_id"],
+                unique=False,
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table in reversed(TABLES):
+            op.drop_index(
+                f"ix_{table}_update_timestamp_email_id",
+                table_name=table,
+                postgresql_concurrently=True,
+            )
@@ -0,0 +1,23 @@
+"""Add emails.content_hash
+
+Revision ID: 5f1c3a2b9d47
+Revises: e43e49174162
+Create Date: 2021-03-05 10:12:04.518326
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5f1c3a2b9d47"  # pragma: allowlist secret
+down_revision = "e43e49174162"  # pragma: allowlist secret
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("emails", sa.Column("content_hash", sa.String(64), nullable=True))
+
+
+def downgrade():
+    op.drop_column("emails", "content_hash")
@@ -0,0 +1,47 @@
+"""Unique newsletter names per contact
+
+Revision ID: 8c2d4e6f1a3b
+Revises: 5f1c3a2b9d47
+Create Date: 2021-03-06 09:27:41.160953
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8c2d4e6f1a3b"  # pragma: allowlist secret
+down_revision = "5f1c3a2b9d47"  # pragma: allowlist secret
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # This fails if a contact has the same newsletter more than once, which
+    # need to be merged first. The new index replaces the email_id index.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "uix_email_name",
+            "newsletters",
+            ["email_id", "name"],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_newsletters_email_id",
+            table_name="newsletters",
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_newsletters_email_id",
+            "newsletters",
+            ["email_id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "uix_email_name", table_name="newsletters", postgresql_concurrently=True
+        )
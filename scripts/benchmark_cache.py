@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Compare the per-process contact cache with the shared response cache.
+
+Each simulated worker process looks up random contacts from a pool of hot
+contacts, filling its cache on a miss with a serialized sample contact. With
+per-process caches, every worker has to miss on each contact. With the shared
+cache, a contact serialized by one worker is a hit for the others.
+
+Usage: python scripts/benchmark_cache.py [--workers 4] [--lookups 20000]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+from time import perf_counter
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ctms.cache import ContactCache, SharedResponseCache  # noqa: E402
+from ctms.sample_data import SAMPLE_MAXIMAL  # noqa: E402
+
+SAMPLE_BODY = SAMPLE_MAXIMAL.json().encode("utf8")
+
+
+def run_worker(args, keys, shared_path, results):
+    random.seed(os.getpid())
+    if shared_path:
+        cache = SharedResponseCache(shared_path, args.slots, 4096, ttl=300)
+    else:
+        cache = ContactCache(args.slots, ttl=300)
+    start = perf_counter()
+    for _ in range(args.lookups):
+        key = random.choice(keys)
+        if cache.get(key) is None:
+            cache.set(key, SAMPLE_BODY)
+    elapsed = perf_counter() - start
+    stats = cache.stats()
+    results.put((stats["hits"], stats["misses"], elapsed))
+
+
+def benchmark(args, keys, shared_path=None):
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    workers = [
+        context.Process(target=run_worker, args=(args, keys, shared_path, results))
+        for _ in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    totals = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    hits = sum(total[0] for total in totals)
+    misses = sum(total[1] for total in totals)
+    elapsed = max(total[2] for total in totals)
+    return hits / (hits + misses), misses, args.workers * args.lookups / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--lookups", type=int, default=20000, help="Per worker")
+    parser.add_argument("--contacts", type=int, default=5000, help="Hot contacts")
+    parser.add_argument("--slots", type=int, default=8192, help="Cache size")
+    args = parser.parse_args()
+
+    keys = [uuid4() for _ in range(args.contacts)]
+    print(f"{'cache':<12} {'hit rate':>9} {'misses':>8} {'lookups/s':>10}")
+    hit_rate, misses, rate = benchmark(args, keys)
+    print(f"{'per-process':<12} {hit_rate:>9.1%} {misses:>8} {rate:>10.0f}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "ctms-cache")
+        hit_rate, misses, rate = benchmark(args, keys, path)
+    print(f"{'shared':<12} {hit_rate:>9.1%} {misses:>8} {rate:>10.0f}")
+    print(
+        "Misses need a database query and serialization, which are not included"
+        " in lookups/s."
+    )
+
+
+if __name__ == "__main__":
+    main()
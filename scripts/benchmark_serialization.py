@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Compare the validated and trusted serialization of GET /ctms/{email_id}.
+
+The validated path is the previous one: build a ContactSchema from the
+contact document, build a CTMSResponse from it, then validate it against the
+response model and encode it like FastAPI. The trusted path projects the
+document onto the response fields and encodes it with the json module.
+
+Usage: python scripts/benchmark_serialization.py [--count 2000]
+"""
+import argparse
+import json
+import os
+import sys
+from timeit import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from ctms.app import ctms_response_data, dump_json  # noqa: E402
+from ctms.sample_data import SAMPLE_MAXIMAL  # noqa: E402
+from ctms.schemas import (  # noqa: E402
+    AddOnsSchema,
+    ContactSchema,
+    CTMSResponse,
+    FirefoxAccountsSchema,
+    VpnWaitlistSchema,
+)
+
+# A document like the one returned by crud.get_contact_by_email_id
+DOCUMENT = json.loads(SAMPLE_MAXIMAL.json())
+DOCUMENT["email"]["create_timestamp"] = "2021-03-04T12:30:45.123+00:00"
+DOCUMENT["email"]["update_timestamp"] = "2021-03-04T12:30:45.123+00:00"
+
+
+def validated(document):
+    contact = ContactSchema(**document)
+    response = CTMSResponse(
+        amo=contact.amo or AddOnsSchema(),
+        email=contact.email,
+        fxa=contact.fxa or FirefoxAccountsSchema(),
+        newsletters=contact.newsletters or [],
+        vpn_waitlist=contact.vpn_waitlist or VpnWaitlistSchema(),
+        status="ok",
+    )
+    # FastAPI validates the returned model against response_model
+    value = CTMSResponse.validate(response.dict())
+    return json.dumps(jsonable_encoder(value)).encode("utf8")
+
+
+def trusted(document):
+    return dump_json(ctms_response_data(document))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--count", type=int, default=2000)
+    args = parser.parse_args()
+
+    assert json.loads(validated(DOCUMENT)) == json.loads(trusted(DOCUMENT))
+    results = {}
+    for name, func in (("validated", validated), ("trusted", trusted)):
+        seconds = timeit(lambda: func(DOCUMENT), number=args.count)
+        results[name] = seconds
+        print(f"{name:<10} {seconds / args.count * 1e6:>8.1f} µs per response")
+    print(f"speedup    {results['validated'] / results['trusted']:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,18 @@
 """pytest fixtures for the CTMS app"""
+import re
 from uuid import UUID
 
 import pytest
 from fastapi.testclient import TestClient
 from pydantic import PostgresDsn
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy_utils.functions import create_database, database_exists, drop_database
 
-from ctms.app import app, get_db
+from ctms.app import app, get_db, get_read_db
 from ctms.config import Settings
 from ctms.crud import create_contact
+from ctms.database import instrument_engine
 from ctms.models import Base
 from ctms.sample_data import SAMPLE_CONTACTS
 
@@ -51,6 +53,7 @@ def engine(pytestconfig):
 
     echo = pytestconfig.getoption("verbose") > 2
     test_engine = create_engine(test_db_url, echo=echo)
+    instrument_engine(test_engine)
 
     # TODO: Convert to running alembic migrations
     Base.metadata.create_all(bind=test_engine)
@@ -84,14 +87,52 @@ def dbsession(connection):
             db.close()
 
     app.dependency_overrides[get_db] = test_get_db
+    app.dependency_overrides[get_read_db] = test_get_db
     yield db
     del app.dependency_overrides[get_db]
+    del app.dependency_overrides[get_read_db]
+
+
+@pytest.fixture
+def statements(connection):
+    """Return a list that collects the SQL statements sent to the database."""
+    collected = []
+
+    def collect_statement(conn, cursor, statement, parameters, context, executemany):
+        collected.append(statement)
+
+    event.listen(connection, "before_cursor_execute", collect_statement)
+    yield collected
+    event.remove(connection, "before_cursor_execute", collect_statement)
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Return a function that checks the SQL statements of a response.
+
+    The count comes from the Server-Timing header, and includes the SAVEPOINT
+    of the test session.
+    """
+
+    def check(resp, budget):
+        server_timing = resp.headers.get("server-timing", "")
+        match = re.search(r'db;desc="(\d+) queries"', server_timing)
+        assert match, f"No SQL statement count in Server-Timing: {server_timing!r}"
+        count = int(match.group(1))
+        assert count <= budget, (
+            f"{resp.request.method} {resp.request.url} made {count} SQL"
+            f" statements, over its budget of {budget}"
+        )
+        return count
+
+    return check
 
 
 @pytest.fixture
 def minimal_contact(dbsession):
     email_id = UUID("93db83d4-4119-4e0c-af87-a713786fa81d")
-    contact = SAMPLE_CONTACTS[email_id]
+    contact = SAMPLE_CONTACTS[email_id].copy(deep=True)
     assert contact.amo is None
     assert contact.fxa is None
     assert contact.vpn_waitlist is None
@@ -103,7 +144,7 @@ def minimal_contact(dbsession):
 @pytest.fixture
 def maximal_contact(dbsession):
     email_id = UUID("67e52c77-950f-4f28-accb-bb3ea1a2c51a")
-    contact = SAMPLE_CONTACTS[email_id]
+    contact = SAMPLE_CONTACTS[email_id].copy(deep=True)
     create_contact(dbsession, email_id, contact)
     dbsession.commit()
     return contact
@@ -112,7 +153,7 @@ def maximal_contact(dbsession):
 @pytest.fixture
 def example_contact(dbsession):
     email_id = UUID("332de237-cab7-4461-bcc3-48e68f42bd5c")
-    contact = SAMPLE_CONTACTS[email_id]
+    contact = SAMPLE_CONTACTS[email_id].copy(deep=True)
     create_contact(dbsession, email_id, contact)
     dbsession.commit()
     return contact
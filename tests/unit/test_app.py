@@ -15,4 +15,6 @@ def test_read_health(client):
     """The platform calls /health to check app readiness."""
     resp = client.get("/health")
     assert resp.status_code == 200
-    assert resp.json() == [{"health": "OK"}, 200]
+    health, status = resp.json()
+    assert health["health"] == "OK"
+    assert status == 200
@@ -0,0 +1,140 @@
+"""pytest tests for the async endpoints, enabled with CTMS_USE_ASYNC_DB"""
+import asyncio
+from uuid import UUID
+
+import pytest
+from fastapi.testclient import TestClient
+
+from ctms.app import app, get_async_db, use_async_routes
+from ctms.sample_data import SAMPLE_CONTACTS
+
+asyncpg = pytest.importorskip("asyncpg")
+
+
+@pytest.fixture
+def async_connection(engine):
+    """Return an asyncpg connection to the test database that rolls back."""
+    loop = asyncio.get_event_loop()
+    connection = loop.run_until_complete(asyncpg.connect(str(engine.url)))
+    transaction = connection.transaction()
+    loop.run_until_complete(transaction.start())
+    yield connection
+    loop.run_until_complete(transaction.rollback())
+    loop.run_until_complete(connection.close())
+
+
+@pytest.fixture
+def async_client(async_connection):
+    """Return a test client for the app with the async endpoints."""
+
+    async def test_get_async_db():
+        yield async_connection
+
+    routes = list(app.router.routes)
+    use_async_routes(app)
+    app.dependency_overrides[get_async_db] = test_get_async_db
+    yield TestClient(app)
+    del app.dependency_overrides[get_async_db]
+    app.router.routes[:] = routes
+
+
+@pytest.fixture
+def async_maximal_contact(async_client):
+    email_id = UUID("67e52c77-950f-4f28-accb-bb3ea1a2c51a")
+    contact = SAMPLE_CONTACTS[email_id].copy(deep=True)
+    resp = async_client.post("/ctms", contact.json())
+    assert resp.status_code == 200
+    return contact
+
+
+def test_get_ctms_async(async_client, async_maximal_contact):
+    """The async GET /ctms/{email_id} returns the same data as the sync one."""
+    email_id = async_maximal_contact.email.email_id
+    resp = async_client.get(f"/ctms/{email_id}")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["status"] == "ok"
+    assert data["email"]["primary_email"] == "mozilla-fan@example.com"
+    assert data["amo"]["create_timestamp"] == "2017-05-12T15:16:00+00:00"
+    assert [nl["name"] for nl in data["newsletters"]] == [
+        nl.name for nl in async_maximal_contact.newsletters
+    ]
+
+
+def test_get_ctms_async_etag(async_client, async_maximal_contact):
+    """The async GET /ctms/{email_id} has an ETag, like the sync one."""
+    email_id = async_maximal_contact.email.email_id
+    resp = async_client.get(f"/ctms/{email_id}")
+    etag = resp.headers["ETag"]
+    resp = async_client.get(f"/ctms/{email_id}", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == etag
+    assert resp.headers["server-timing"].startswith('db;desc="1 queries";dur=')
+
+
+def test_get_ctms_async_not_found(async_client):
+    """The async GET /ctms/{unknown email_id} returns a 404."""
+    resp = async_client.get("/ctms/cad092ec-a71a-4df5-aa92-517959caeecb")
+    assert resp.status_code == 404
+    assert resp.json() == {"detail": "Unknown email_id"}
+
+
+@pytest.mark.parametrize(
+    "alt_id_name,alt_id_value",
+    [
+        ("primary_email", "Mozilla-Fan@example.com"),
+        ("basket_token", "d9ba6182-f5dd-4728-a477-2cc11bf62b69"),
+        ("amo_user_id", 123),
+        ("fxa_primary_email", "fxa-firefox-fan@example.com"),
+    ],
+)
+def test_get_ctms_by_alt_id_async(
+    async_client, async_maximal_contact, alt_id_name, alt_id_value
+):
+    """The async GET /ctms finds contacts by alternate ID."""
+    resp = async_client.get("/ctms", params={alt_id_name: alt_id_value})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert len(data) == 1
+    assert data[0]["email"]["email_id"] == str(async_maximal_contact.email.email_id)
+
+
+def test_get_ctms_by_no_ids_async(async_client):
+    """The async GET /ctms with no ID query is an error."""
+    resp = async_client.get("/ctms")
+    assert resp.status_code == 400
+
+
+def test_create_async_idempotent(async_client, async_maximal_contact):
+    """The async POST /ctms accepts retries but rejects changes."""
+    resp = async_client.post("/ctms", async_maximal_contact.json())
+    assert resp.status_code == 200
+
+    async_maximal_contact.email.mailing_country = "mx"
+    resp = async_client.post("/ctms", async_maximal_contact.json())
+    assert resp.status_code == 409
+
+
+def test_create_async_idempotent_with_stale_hash(
+    async_client, async_connection, async_maximal_contact
+):
+    """The async POST /ctms recomputes a stored hash from older schemas."""
+    asyncio.get_event_loop().run_until_complete(
+        async_connection.execute(
+            "UPDATE emails SET content_hash = $1 WHERE email_id = $2",
+            "0" * 64,
+            async_maximal_contact.email.email_id,
+        )
+    )
+    resp = async_client.post("/ctms", async_maximal_contact.json())
+    assert resp.status_code == 200
+
+
+def test_create_async_with_email_collision(async_client, async_maximal_contact):
+    """The async POST /ctms rejects a new contact with an existing email."""
+    contact = SAMPLE_CONTACTS[UUID("d1da1c99-fe09-44db-9c68-78a75752574d")].copy(
+        deep=True
+    )
+    contact.email.primary_email = async_maximal_contact.email.primary_email
+    resp = async_client.post("/ctms", contact.json())
+    assert resp.status_code == 409
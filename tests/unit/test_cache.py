@@ -0,0 +1,338 @@
+"""pytest tests for the contact cache"""
+import multiprocessing
+from datetime import datetime, timezone
+from unittest import mock
+from uuid import UUID, uuid4
+
+import pytest
+
+import ctms.app
+from ctms.cache import ContactCache, SharedResponseCache
+from ctms.models import Email
+from ctms.sample_data import SAMPLE_CONTACTS
+
+
+def test_cache_get_and_set():
+    """Cached values are returned, and lookups are counted."""
+    cache = ContactCache(max_size=2, ttl=60)
+    assert cache.get("a") is None
+    cache.set("a", {"value": 1})
+    assert cache.get("a") == {"value": 1}
+    assert cache.stats() == {
+        "size": 1,
+        "hits": 1,
+        "misses": 1,
+        "evictions": 0,
+        "expirations": 0,
+    }
+
+
+def test_cache_lru_eviction():
+    """The least recently used value is evicted when the cache is full."""
+    cache = ContactCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_ttl_expiration():
+    """Values expire after the TTL."""
+    cache = ContactCache(max_size=2, ttl=30)
+    with mock.patch("ctms.cache.monotonic", return_value=100.0):
+        cache.set("a", 1)
+    with mock.patch("ctms.cache.monotonic", return_value=129.0):
+        assert cache.get("a") == 1
+    with mock.patch("ctms.cache.monotonic", return_value=130.0):
+        assert cache.get("a") is None
+    stats = cache.stats()
+    assert stats["expirations"] == 1
+    assert stats["size"] == 0
+
+
+def test_cache_invalidate():
+    cache = ContactCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.invalidate("a")
+    cache.invalidate("missing")
+    assert cache.get("a") is None
+
+
+def test_cache_hold_after_invalidate():
+    """Values read soon after an invalidation are not cached."""
+    cache = ContactCache(max_size=2, ttl=60, hold=2)
+    with mock.patch("ctms.cache.monotonic", return_value=100.0):
+        cache.set("a", "old")
+        cache.invalidate("a")
+    with mock.patch("ctms.cache.monotonic", return_value=103.0):
+        # Read before the invalidation, or from a replica that was behind
+        cache.set("a", "old", started=99.0)
+        cache.set("a", "old", started=101.0)
+        assert cache.get("a") is None
+        cache.set("a", "new", started=102.0)
+        assert cache.get("a") == "new"
+        # Ended holds are dropped on the next invalidation
+        cache.invalidate("b")
+        assert list(cache._held) == ["b"]
+
+
+@pytest.fixture
+def contact_cache(monkeypatch):
+    """Enable the contact cache for the app."""
+    cache = ContactCache(max_size=10, ttl=60)
+    monkeypatch.setattr(ctms.app, "contact_cache", cache)
+    return cache
+
+
+def test_get_ctms_cached(client, maximal_contact, contact_cache, statements):
+    """Repeated requests for a contact are served from the cache."""
+    email_id = maximal_contact.email.email_id
+    for attempt in range(2):
+        resp = client.get(f"/ctms/{email_id}")
+        assert resp.status_code == 200
+    assert len([sql for sql in statements if sql.startswith("SELECT")]) == 1
+    stats = contact_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_get_ctms_read_primary_skips_cache(
+    client, maximal_contact, contact_cache, statements
+):
+    """A read from the primary database doesn't use the cached contact."""
+    email_id = maximal_contact.email.email_id
+    contact_cache.set(email_id, {"stale": True})
+    resp = client.get(f"/ctms/{email_id}", headers={"X-CTMS-Read-Primary": "1"})
+    assert resp.status_code == 200
+    assert resp.json()["email"]["email_id"] == str(email_id)
+    assert len([sql for sql in statements if sql.startswith("SELECT")]) == 1
+    # The cache has the contact from the database
+    assert contact_cache.get(email_id)["email"]["email_id"] == str(email_id)
+
+
+def test_get_ctms_stale_cache_not_modified(
+    client, maximal_contact, contact_cache, dbsession
+):
+    """A stale cached contact is replaced, not used for a 304 response."""
+    email_id = maximal_contact.email.email_id
+    resp = client.get(f"/ctms/{email_id}")
+    etag = resp.headers["ETag"]
+    dbsession.query(Email).filter(Email.email_id == email_id).update(
+        {
+            Email.first_name: "Updated",
+            Email.update_timestamp: datetime.now(timezone.utc),
+        }
+    )
+    dbsession.commit()
+
+    # The cached contact has the client's ETag, but the database is newer
+    resp = client.get(f"/ctms/{email_id}", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+    assert resp.json()["email"]["first_name"] == "Updated"
+    assert contact_cache.get(email_id)["email"]["first_name"] == "Updated"
+
+
+def test_get_ctms_not_found_not_cached(client, dbsession, contact_cache):
+    """Unknown contacts are not cached."""
+    resp = client.get("/ctms/cad092ec-a71a-4df5-aa92-517959caeecb")
+    assert resp.status_code == 404
+    assert contact_cache.stats()["size"] == 0
+
+
+def test_create_ctms_invalidates_cache(client, dbsession, contact_cache):
+    """Creating a contact removes it from the cache."""
+    email_id = UUID("67e52c77-950f-4f28-accb-bb3ea1a2c51a")
+    contact_cache.set(email_id, {"stale": True})
+    resp = client.post("/ctms", SAMPLE_CONTACTS[email_id].json())
+    assert resp.status_code == 200
+    assert contact_cache.get(email_id) is None
+
+
+def test_health_includes_cache_stats(client, contact_cache):
+    resp = client.get("/health")
+    assert resp.status_code == 200
+    assert resp.json()[0]["contact_cache"]["size"] == 0
+
+
+@pytest.fixture
+def shared_cache_path(tmp_path):
+    return str(tmp_path / "ctms-cache")
+
+
+def test_shared_cache_get_and_set(shared_cache_path):
+    cache = SharedResponseCache(shared_cache_path, slots=8, slot_size=128, ttl=60)
+    key = uuid4()
+    assert cache.get(key) is None
+    cache.set(key, b'{"status": "ok"}')
+    assert cache.get(key) == b'{"status": "ok"}'
+    cache.set(key, b"{}")
+    assert cache.get(key) == b"{}"
+    assert cache.stats() == {"hits": 2, "misses": 1, "evictions": 0}
+
+
+def test_shared_cache_too_large(shared_cache_path):
+    """Values larger than a slot are not cached."""
+    cache = SharedResponseCache(shared_cache_path, slots=8, slot_size=64, ttl=60)
+    key = uuid4()
+    cache.set(key, b"x" * 64)
+    assert cache.get(key) is None
+
+
+def test_shared_cache_ttl_expiration(shared_cache_path):
+    cache = SharedResponseCache(shared_cache_path, slots=8, slot_size=128, ttl=30)
+    key = uuid4()
+    with mock.patch("ctms.cache.time", return_value=100.0):
+        cache.set(key, b"{}")
+    with mock.patch("ctms.cache.time", return_value=129.0):
+        assert cache.get(key) == b"{}"
+    with mock.patch("ctms.cache.time", return_value=130.0):
+        assert cache.get(key) is None
+
+
+def test_shared_cache_eviction(shared_cache_path):
+    """A full set of slots replaces the entry closest to expiring."""
+    cache = SharedResponseCache(
+        shared_cache_path, slots=2, slot_size=128, ttl=60, ways=2
+    )
+    keys = [uuid4() for _ in range(3)]
+    for now, key in enumerate(keys):
+        with mock.patch("ctms.cache.time", return_value=float(now)):
+            cache.set(key, key.bytes)
+    with mock.patch("ctms.cache.time", return_value=10.0):
+        assert cache.get(keys[0]) is None
+        assert cache.get(keys[1]) == keys[1].bytes
+        assert cache.get(keys[2]) == keys[2].bytes
+    assert cache.stats()["evictions"] == 1
+
+
+def test_shared_cache_hold_after_invalidate(shared_cache_path):
+    """Values read soon after an invalidation are not cached."""
+    cache = SharedResponseCache(
+        shared_cache_path, slots=8, slot_size=128, ttl=60, hold=2
+    )
+    key = uuid4()
+    with mock.patch("ctms.cache.time", return_value=100.0):
+        cache.set(key, b"old")
+        cache.invalidate(key)
+        assert cache.get(key) is None
+    with mock.patch("ctms.cache.time", return_value=103.0):
+        # Read before the invalidation, or from a replica that was behind
+        cache.set(key, b"old", started=99.0)
+        cache.set(key, b"old", started=101.0)
+        assert cache.get(key) is None
+        cache.set(key, b"new", started=102.0)
+        assert cache.get(key) == b"new"
+
+
+def test_shared_cache_between_processes(shared_cache_path):
+    """Values and invalidations are seen by other processes."""
+    key = uuid4()
+    cache = SharedResponseCache(shared_cache_path, slots=8, slot_size=128, ttl=60)
+
+    def set_in_worker():
+        worker_cache = SharedResponseCache(
+            shared_cache_path, slots=8, slot_size=128, ttl=60
+        )
+        worker_cache.set(key, b"from worker")
+
+    worker = multiprocessing.get_context("fork").Process(target=set_in_worker)
+    worker.start()
+    worker.join()
+    assert worker.exitcode == 0
+    assert cache.get(key) == b"from worker"
+
+    other_cache = SharedResponseCache(shared_cache_path, slots=8, slot_size=128, ttl=60)
+    other_cache.invalidate(key)
+    assert cache.get(key) is None
+
+
+def test_shared_cache_new_layout(shared_cache_path):
+    """A cache file with a different layout is cleared."""
+    key = uuid4()
+    cache = SharedResponseCache(shared_cache_path, slots=8, slot_size=128, ttl=60)
+    cache.set(key, b"{}")
+    cache.close()
+    cache = SharedResponseCache(shared_cache_path, slots=16, slot_size=128, ttl=60)
+    assert cache.get(key) is None
+
+
+@pytest.fixture
+def shared_cache(monkeypatch, shared_cache_path):
+    """Enable the shared response cache for the app."""
+    cache = SharedResponseCache(shared_cache_path, slots=8, slot_size=4096, ttl=60)
+    monkeypatch.setattr(ctms.app, "shared_cache", cache)
+    yield cache
+    cache.close()
+
+
+def test_get_ctms_shared_cache(client, maximal_contact, shared_cache, statements):
+    """The shared cache returns the same response, without a query."""
+    email_id = maximal_contact.email.email_id
+    resp = client.get(f"/ctms/{email_id}")
+    assert resp.status_code == 200
+    expected = resp.json()
+    etag = resp.headers["ETag"]
+    assert shared_cache.get(email_id) is not None
+
+    del statements[:]
+    resp = client.get(f"/ctms/{email_id}")
+    assert resp.status_code == 200
+    assert resp.json() == expected
+    assert not [sql for sql in statements if sql.startswith("SELECT")]
+
+    assert resp.headers["ETag"] == etag
+    resp = client.get(f"/ctms/{email_id}", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+
+    ctms.app.shared_cache = None
+    assert client.get(f"/ctms/{email_id}").json() == expected
+
+
+def test_get_ctms_read_primary_skips_shared_cache(
+    client, maximal_contact, shared_cache
+):
+    """A read from the primary database doesn't use the shared cache."""
+    email_id = maximal_contact.email.email_id
+    shared_cache.set(email_id, b'"0"\n{"stale": true}')
+    resp = client.get(f"/ctms/{email_id}", headers={"X-CTMS-Read-Primary": "1"})
+    assert resp.status_code == 200
+    assert resp.json()["email"]["email_id"] == str(email_id)
+    assert shared_cache.get(email_id) == b'"0"\n{"stale": true}'
+
+    shared_cache.hold = 0
+    shared_cache.invalidate(email_id)
+    resp = client.get(f"/ctms/{email_id}", headers={"X-CTMS-Read-Primary": "1"})
+    assert resp.status_code == 200
+    assert shared_cache.get(email_id) is None
+
+
+def test_get_ctms_shared_cache_not_found(client, dbsession, shared_cache):
+    resp = client.get("/ctms/cad092ec-a71a-4df5-aa92-517959caeecb")
+    assert resp.status_code == 404
+    assert resp.json() == {"detail": "Unknown email_id"}
+
+
+def test_create_ctms_invalidates_shared_cache(client, dbsession, shared_cache):
+    """Creating a contact removes it from the shared cache."""
+    email_id = UUID("67e52c77-950f-4f28-accb-bb3ea1a2c51a")
+    shared_cache.set(email_id, b'{"stale": true}')
+    resp = client.post("/ctms", SAMPLE_CONTACTS[email_id].json())
+    assert resp.status_code == 200
+    assert shared_cache.get(email_id) is None
+
+
+def test_get_ctms_shared_cache_skips_contact_cache(
+    client, maximal_contact, contact_cache, shared_cache
+):
+    """The shared cache is filled from the database, not the contact cache."""
+    email_id = maximal_contact.email.email_id
+    contact_cache.set(email_id, {"stale": True})
+    resp = client.get(f"/ctms/{email_id}")
+    assert resp.status_code == 200
+    assert resp.json()["email"]["email_id"] == str(email_id)
+    assert b"stale" not in shared_cache.get(email_id)
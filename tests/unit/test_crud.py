@@ -0,0 +1,131 @@
+"""pytest tests for the database queries in ctms.crud"""
+from unittest import mock
+from uuid import UUID
+
+import pytest
+
+from ctms.crud import (
+    contact_content_hash,
+    contact_document_updated,
+    create_contacts,
+    get_contact_by_email_id,
+    get_contact_updated,
+    get_contacts_by_any_id,
+    get_content_hashes,
+    iter_contacts,
+)
+from ctms.models import Email
+from ctms.sample_data import SAMPLE_CONTACTS
+from ctms.schemas import ContactInSchema, ContactSchema
+
+
+@pytest.mark.parametrize("name", ("minimal", "maximal", "example"))
+def test_get_contact_by_email_id_matches_orm(dbsession, sample_contacts, name):
+    """The JSON contact document has the same data as the ORM objects."""
+    email_id, contact = sample_contacts[name]
+    document = get_contact_by_email_id(dbsession, email_id)
+    (orm_data,) = get_contacts_by_any_id(dbsession, email_id=email_id)
+    assert ContactSchema(**document) == ContactSchema(**orm_data)
+
+
+def test_get_contact_by_email_id_one_statement(dbsession, maximal_contact, statements):
+    """The contact document is fetched in a single statement."""
+    email_id = maximal_contact.email.email_id
+    document = get_contact_by_email_id(dbsession, email_id)
+    assert len(statements) == 1
+    assert document["email"]["email_id"] == str(email_id)
+    assert [nl["name"] for nl in document["newsletters"]] == [
+        nl.name for nl in maximal_contact.newsletters
+    ]
+
+
+def test_get_contact_by_email_id_no_satellites(dbsession, minimal_contact):
+    """Missing satellite rows are returned as None."""
+    document = get_contact_by_email_id(dbsession, minimal_contact.email.email_id)
+    assert document["amo"] is None
+    assert document["fxa"] is None
+    assert document["vpn_waitlist"] is None
+
+
+def test_get_contact_by_email_id_not_found(dbsession):
+    """None is returned for an unknown email_id."""
+    email_id = UUID("cad092ec-a71a-4df5-aa92-517959caeecb")
+    assert get_contact_by_email_id(dbsession, email_id) is None
+
+
+@pytest.mark.parametrize("name", ("minimal", "maximal", "example"))
+def test_get_contact_updated(dbsession, sample_contacts, name):
+    """The updated timestamp query matches the contact document."""
+    email_id, contact = sample_contacts[name]
+    updated = get_contact_updated(dbsession, email_id)
+    assert updated is not None
+    document = get_contact_by_email_id(dbsession, email_id)
+    assert contact_document_updated(document) == updated
+
+
+def test_get_contact_updated_not_found(dbsession):
+    email_id = UUID("cad092ec-a71a-4df5-aa92-517959caeecb")
+    assert get_contact_updated(dbsession, email_id) is None
+
+
+def test_iter_contacts_in_chunks(dbsession, sample_contacts):
+    """All contacts are returned in chunks, with their newsletters."""
+    contacts = dict(sample_contacts.values())
+    chunks = list(iter_contacts(dbsession, chunk_size=2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    for chunk in chunks:
+        for data in chunk:
+            expected = contacts[data["email"].email_id]
+            assert [nl.name for nl in data["newsletters"]] == [
+                nl.name for nl in expected.newsletters
+            ]
+
+
+@pytest.mark.parametrize("name", ("minimal", "maximal", "example"))
+def test_content_hash_stored(dbsession, sample_contacts, name):
+    """The content hash is stored when the contact is created."""
+    email_id, contact = sample_contacts[name]
+    hashes = get_content_hashes(dbsession, [email_id])
+    assert hashes == {email_id: contact_content_hash(contact)}
+    document = get_contact_by_email_id(dbsession, email_id)
+    assert contact_content_hash(ContactInSchema(**document)) == hashes[email_id]
+
+
+def test_content_hash_ignores_amo_timestamps(maximal_contact):
+    """The amo timestamps are not part of the content hash."""
+    changed = maximal_contact.copy(deep=True)
+    changed.amo.update_timestamp = None
+    assert contact_content_hash(changed) == contact_content_hash(maximal_contact)
+    changed.amo.display_name = "Changed"
+    assert contact_content_hash(changed) != contact_content_hash(maximal_contact)
+
+
+def test_content_hash_legacy_contact(dbsession, maximal_contact, statements):
+    """Contacts without a stored hash are hashed from their data."""
+    email_id = maximal_contact.email.email_id
+    dbsession.query(Email).filter(Email.email_id == email_id).update(
+        {"content_hash": None}, synchronize_session=False
+    )
+    statements.clear()
+    hashes = get_content_hashes(dbsession, [email_id])
+    assert hashes == {email_id: contact_content_hash(maximal_contact)}
+    assert len([sql for sql in statements if sql.startswith("SELECT")]) > 1
+
+
+def test_create_contacts_hashes_once(dbsession):
+    """Bulk create hashes each contact once."""
+    contacts = [
+        ContactInSchema(**contact.dict())
+        for contact in SAMPLE_CONTACTS.contacts.values()
+    ]
+    with mock.patch(
+        "ctms.crud.contact_content_hash", wraps=contact_content_hash
+    ) as content_hash:
+        created = create_contacts(dbsession, contacts)
+    assert len(created) == len(contacts)
+    assert content_hash.call_count == len(contacts)
+
+
+def test_content_hashes_not_found(dbsession):
+    email_id = UUID("cad092ec-a71a-4df5-aa92-517959caeecb")
+    assert get_content_hashes(dbsession, [email_id]) == {}
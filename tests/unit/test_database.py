@@ -0,0 +1,221 @@
+"""pytest tests for the database connection pool in ctms.database"""
+import pytest
+from pydantic import ValidationError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool
+
+import ctms.app
+from ctms.app import app, get_db, get_read_db
+from ctms.config import Settings
+from ctms.database import MeteredQueuePool, get_db_engine, pool_metrics, pool_sizes
+
+
+@pytest.fixture
+def pool_settings(engine):
+    """Return settings for a small pool on the test database."""
+    return Settings(
+        db_url=str(engine.url),
+        db_pool_size=1,
+        db_max_overflow=1,
+        db_pool_timeout=0.1,
+        db_pool_recycle=3600,
+    )
+
+
+@pytest.fixture
+def metered_engine(pool_settings):
+    pool_metrics.reset()
+    db_engine, _ = get_db_engine(pool_settings)
+    yield db_engine
+    db_engine.dispose()
+    pool_metrics.reset()
+
+
+def test_get_db_engine_pool_settings(metered_engine):
+    """The pool is configured from the settings."""
+    pool = metered_engine.pool
+    assert isinstance(pool, MeteredQueuePool)
+    assert pool.size() == 1
+    assert pool._max_overflow == 1
+    assert pool._timeout == 0.1
+    assert pool._pre_ping
+    assert pool._recycle == 3600
+
+
+def test_pool_metrics_checkouts(metered_engine):
+    """Connects, checkouts and checkins are counted."""
+    with metered_engine.connect() as conn:
+        conn.execute("SELECT 1")
+        assert pool_metrics.as_dict()["checked_out"] == 1
+    with metered_engine.connect() as conn:
+        conn.execute("SELECT 1")
+    metrics = pool_metrics.as_dict()
+    assert metrics["connects"] == 1
+    assert metrics["checkouts"] == 2
+    assert metrics["checkins"] == 2
+    assert metrics["checked_out"] == 0
+    assert metrics["timeouts"] == 0
+
+
+def test_pool_metrics_timeout(metered_engine):
+    """Waiting for a connection from an exhausted pool is measured."""
+    first = metered_engine.connect()
+    overflow = metered_engine.connect()
+    try:
+        with pytest.raises(PoolTimeoutError):
+            metered_engine.connect()
+    finally:
+        first.close()
+        overflow.close()
+    metrics = pool_metrics.as_dict()
+    assert metrics["timeouts"] == 1
+    assert metrics["max_wait_seconds"] >= 0.1
+    assert metrics["wait_seconds"] >= metrics["max_wait_seconds"]
+
+
+def test_pool_sizes_shared_with_async(engine):
+    """With the async pool, the pool settings are split between the pools."""
+    settings = Settings(
+        db_url=str(engine.url), use_async_db=True, db_pool_size=5, db_max_overflow=10
+    )
+    assert pool_sizes(settings) == (3, 5)
+    assert pool_sizes(settings, for_async=True) == (2, 5)
+    db_engine, _ = get_db_engine(settings)
+    assert db_engine.pool.size() == 3
+    db_engine.dispose()
+
+
+@pytest.mark.parametrize(
+    "options,message",
+    (
+        ({"db_replica_url": "postgres://replica/ctms"}, "db_replica_url"),
+        ({"use_contact_cache": True}, "use_contact_cache"),
+        ({"shared_cache_path": "/dev/shm/ctms-cache"}, "shared_cache_path"),
+        ({"db_pool_size": 1}, "db_pool_size of at least 2"),
+    ),
+)
+def test_async_db_unsupported_settings(engine, options, message):
+    """The async endpoints refuse the settings they don't support."""
+    with pytest.raises(ValidationError, match=message):
+        Settings(db_url=str(engine.url), use_async_db=True, **options)
+
+
+@pytest.fixture
+def pooler_sessionmaker(engine, monkeypatch):
+    """Use an external pooler configuration for get_db."""
+    pool_metrics.reset()
+    settings = Settings(db_url=str(engine.url), db_external_pooler=True)
+    db_engine, SessionLocal = get_db_engine(settings)
+    monkeypatch.setattr(ctms.app, "SessionLocal", SessionLocal)
+    yield SessionLocal
+    db_engine.dispose()
+    pool_metrics.reset()
+
+
+def test_get_db_engine_external_pooler(pooler_sessionmaker):
+    """There is no client-side pool with an external pooler."""
+    assert isinstance(pooler_sessionmaker.kw["bind"].pool, NullPool)
+
+
+def test_get_db_external_pooler_lifecycle(pooler_sessionmaker):
+    """Each get_db session opens and closes its own connection."""
+    for request in range(2):
+        db_gen = get_db()
+        db = next(db_gen)
+        assert db.execute("SELECT 1").scalar() == 1
+        with pytest.raises(StopIteration):
+            next(db_gen)
+    metrics = pool_metrics.as_dict()
+    assert metrics["connects"] == 2
+    assert metrics["checkouts"] == 2
+    assert metrics["checked_out"] == 0
+
+
+def test_get_db_external_pooler_no_session_state(pooler_sessionmaker):
+    """Session settings don't carry over to the next get_db session."""
+    db_gen = get_db()
+    db = next(db_gen)
+    db.execute("SET application_name = 'ctms-leak'")
+    with pytest.raises(StopIteration):
+        next(db_gen)
+
+    db_gen = get_db()
+    db = next(db_gen)
+    assert db.execute("SHOW application_name").scalar() != "ctms-leak"
+    db_gen.close()
+    assert pool_metrics.as_dict()["checked_out"] == 0
+
+
+def test_get_db_external_pooler_error(pooler_sessionmaker):
+    """The connection is closed when the request fails."""
+    db_gen = get_db()
+    db = next(db_gen)
+    db.execute("SELECT 1")
+    with pytest.raises(ValueError):
+        db_gen.throw(ValueError("request failed"))
+    assert pool_metrics.as_dict()["checked_out"] == 0
+
+
+@pytest.fixture
+def replica_sessionmakers(engine, monkeypatch):
+    """Configure separate primary and replica sessionmakers for the app."""
+    settings = Settings(db_url=str(engine.url), db_replica_url=str(engine.url))
+    primary_engine, SessionLocal = get_db_engine(settings)
+    replica_engine, ReplicaSessionLocal = get_db_engine(
+        settings, settings.db_replica_url
+    )
+    monkeypatch.setattr(ctms.app, "SessionLocal", SessionLocal)
+    monkeypatch.setattr(ctms.app, "ReplicaSessionLocal", ReplicaSessionLocal)
+    yield primary_engine, replica_engine
+    primary_engine.dispose()
+    replica_engine.dispose()
+
+
+@pytest.mark.parametrize(
+    "read_primary,expected", ((False, "replica"), (True, "primary"))
+)
+def test_get_read_db_replica(replica_sessionmakers, read_primary, expected):
+    """Reads go to the replica, unless the primary is requested."""
+    engines = dict(zip(("primary", "replica"), replica_sessionmakers))
+    db_gen = get_read_db(read_primary=read_primary)
+    db = next(db_gen)
+    assert db.get_bind() is engines[expected]
+    db_gen.close()
+
+
+def test_get_read_db_no_replica(replica_sessionmakers, monkeypatch):
+    """Reads go to the primary when there is no replica."""
+    monkeypatch.setattr(ctms.app, "ReplicaSessionLocal", None)
+    db_gen = get_read_db(read_primary=False)
+    db = next(db_gen)
+    assert db.get_bind() is replica_sessionmakers[0]
+    db_gen.close()
+
+
+def test_read_endpoints_use_read_db(client, dbsession, maximal_contact):
+    """The GET endpoints don't use the primary session."""
+
+    def no_primary_db():
+        raise AssertionError("Used the primary database")
+
+    email_id = maximal_contact.email.email_id
+    app.dependency_overrides[get_db] = no_primary_db
+    for path in (
+        f"/ctms/{email_id}",
+        f"/identity/{email_id}",
+        f"/contact/email/{email_id}",
+        f"/contact/amo/{email_id}",
+        f"/contact/vpn_waitlist/{email_id}",
+        f"/contact/fxa/{email_id}",
+    ):
+        assert client.get(path).status_code == 200, path
+    assert client.get("/ctms", params={"email_id": str(email_id)}).status_code == 200
+    assert client.get("/identities", params={"amo_user_id": "123"}).status_code == 200
+
+
+def test_health_includes_pool_metrics(client):
+    """The health check reports the pool metrics."""
+    resp = client.get("/health")
+    assert resp.status_code == 200
+    health = resp.json()[0]
+    assert set(health["database_pool"]) >= {"checkouts", "timeouts", "wait_seconds"}
@@ -0,0 +1,126 @@
+"""pytest tests for the Prometheus metrics in ctms.metrics"""
+import os
+import subprocess
+import sys
+
+import pytest
+from prometheus_client import REGISTRY, CollectorRegistry, multiprocess
+
+from ctms.config import Settings
+from ctms.database import get_db_engine
+
+
+def sample_value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_request_metrics_by_route_template(client, minimal_contact):
+    """Requests are counted and timed by route template and status code."""
+    email_id = minimal_contact.email.email_id
+    labels = {"method": "GET", "path_template": "/contact/amo/{email_id}"}
+    count = sample_value("ctms_requests_total", status_code="200", **labels)
+    timed = sample_value("ctms_request_duration_seconds_count", **labels)
+    assert client.get(f"/contact/amo/{email_id}").status_code == 200
+    assert sample_value("ctms_requests_total", status_code="200", **labels) == (
+        count + 1
+    )
+    assert sample_value("ctms_request_duration_seconds_count", **labels) == timed + 1
+
+
+def test_request_metrics_status_codes(client, dbsession):
+    """Error responses are counted by status code, unknown paths together."""
+    found = {"method": "GET", "path_template": "/ctms/{email_id}"}
+    unknown = {"method": "GET", "path_template": "unmatched"}
+    not_found = sample_value("ctms_requests_total", status_code="404", **found)
+    unmatched = sample_value("ctms_requests_total", status_code="404", **unknown)
+    resp = client.get("/ctms/cad092ec-a71a-4df5-aa92-517959caeecb")
+    assert resp.status_code == 404
+    assert client.get("/not-a-path").status_code == 404
+    assert sample_value("ctms_requests_total", status_code="404", **found) == (
+        not_found + 1
+    )
+    assert sample_value("ctms_requests_total", status_code="404", **unknown) == (
+        unmatched + 1
+    )
+
+
+def test_database_metrics(engine):
+    """Pool checkouts and queries are counted."""
+    checkouts = sample_value("ctms_db_pool_checkouts_total")
+    queries = sample_value("ctms_db_queries_total")
+    checked_out = sample_value("ctms_db_pool_checked_out")
+    db_engine, _ = get_db_engine(Settings(db_url=str(engine.url)))
+    try:
+        with db_engine.connect() as conn:
+            conn.execute("SELECT 1")
+            conn.execute("SELECT 2")
+            assert sample_value("ctms_db_pool_checked_out") == checked_out + 1
+    finally:
+        db_engine.dispose()
+    assert sample_value("ctms_db_pool_checkouts_total") == checkouts + 1
+    assert sample_value("ctms_db_queries_total") == queries + 2
+    assert sample_value("ctms_db_pool_checked_out") == checked_out
+
+
+def test_metrics_endpoint(client):
+    """GET /metrics returns the metrics in the Prometheus text format."""
+    client.get("/health")
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert (
+        'ctms_requests_total{method="GET",path_template="/health",status_code="200"}'
+        in resp.text
+    )
+    assert "ctms_db_pool_wait_seconds_bucket" in resp.text
+
+
+WORKER_SCRIPT = """
+from ctms.metrics import REQUESTS
+REQUESTS.labels("GET", "/ctms/{email_id}", 200).inc()
+"""
+
+
+def test_metrics_combine_worker_processes(tmp_path):
+    """With prometheus_multiproc_dir, the metrics are summed across processes."""
+    env = dict(os.environ, prometheus_multiproc_dir=str(tmp_path))
+    for worker in range(2):
+        subprocess.run([sys.executable, "-c", WORKER_SCRIPT], env=env, check=True)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=str(tmp_path))
+    labels = {
+        "method": "GET",
+        "path_template": "/ctms/{email_id}",
+        "status_code": "200",
+    }
+    assert registry.get_sample_value("ctms_requests_total", labels) == 2
+
+
+def test_server_timing_header(client, minimal_contact):
+    """The SQL statements of a request are reported in Server-Timing."""
+    email_id = minimal_contact.email.email_id
+    labels = {"method": "GET", "path_template": "/identity/{email_id}"}
+    queries = sample_value("ctms_request_db_queries_sum", **labels)
+    resp = client.get(f"/identity/{email_id}")
+    assert resp.status_code == 200
+    # The test session's SAVEPOINT, and the identity query
+    assert resp.headers["server-timing"].startswith('db;desc="2 queries";dur=')
+    assert sample_value("ctms_request_db_queries_sum", **labels) == queries + 2
+
+
+def test_query_budget_exceeded(client, minimal_contact, query_budget):
+    """The query_budget fixture fails for a request over its budget."""
+    resp = client.get(f"/identity/{minimal_contact.email.email_id}")
+    assert query_budget(resp, 2) == 2
+    with pytest.raises(AssertionError, match="over its budget of 1"):
+        query_budget(resp, 1)
+
+
+def test_failed_query_is_not_counted_twice(engine):
+    """A failed statement doesn't leave a start time for the next one."""
+    with engine.connect() as conn:
+        with pytest.raises(Exception):
+            conn.execute("SELECT no_such_column")
+        assert conn.info["query_start"] == []
+        conn.execute("SELECT 1")
+        assert conn.info["query_start"] == []
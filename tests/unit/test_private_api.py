@@ -26,6 +26,16 @@ def test_get_identity_by_email_id(client, sample_contacts, name):
     assert resp.json() == identity_response_for_contact(contact)
 
 
+def test_get_identity_projected(client, maximal_contact, statements):
+    """GET /identity/{email_id} selects just the identity columns."""
+    resp = client.get(f"/identity/{maximal_contact.email.email_id}")
+    assert resp.status_code == 200
+    (select,) = [sql for sql in statements if sql.startswith("SELECT")]
+    assert "newsletters" not in select
+    assert "vpn_waitlist" not in select
+    assert "emails.first_name" not in select
+
+
 def test_get_identity_not_found(client, dbsession):
     """GET /identity/{unknown email_id} returns a 404."""
     email_id = "cad092ec-a71a-4df5-aa92-517959caeecb"
@@ -135,6 +145,63 @@ def test_get_subgroup(client, minimal_contact, subgroup):
     assert resp.json() == full_json[subgroup]
 
 
+@pytest.mark.parametrize("subgroup", ("email", "amo", "vpn_waitlist", "fxa"))
+def test_get_subgroup_one_table(client, maximal_contact, statements, subgroup):
+    """GET /contact/{subgroup}/{email_id} queries only the subgroup table."""
+    email_id = maximal_contact.email.email_id
+    resp = client.get(f"/contact/{subgroup}/{email_id}")
+    assert resp.status_code == 200
+    (select,) = [sql for sql in statements if sql.startswith("SELECT")]
+    tables = {"emails", "amo", "fxa", "vpn_waitlist", "newsletters"}
+    joined = {table for table in tables if f"JOIN {table} " in select}
+    assert joined == (set() if subgroup == "email" else {subgroup})
+
+
+@pytest.mark.parametrize("subgroup", ("email", "amo", "vpn_waitlist", "fxa"))
+def test_get_subgroup_not_modified(client, maximal_contact, subgroup):
+    """GET /contact/{subgroup}/{email_id} supports If-None-Match."""
+    email_id = maximal_contact.email.email_id
+    resp = client.get(f"/contact/{subgroup}/{email_id}")
+    assert resp.status_code == 200
+    etag = resp.headers["ETag"]
+    resp = client.get(
+        f"/contact/{subgroup}/{email_id}", headers={"If-None-Match": etag}
+    )
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == etag
+
+
+@pytest.mark.parametrize(
+    "method,path,body",
+    (
+        ("PATCH", "/ctms/{email_id}", {"newsletters": [{"name": "app-dev"}]}),
+        ("POST", "/newsletters/bulk", {"name": "app-dev"}),
+    ),
+)
+def test_get_email_changed_content_hash(client, maximal_contact, method, path, body):
+    """The email ETag changes with the content hash, even for other tables."""
+    email_id = maximal_contact.email.email_id
+    resp = client.get(f"/contact/email/{email_id}")
+    etag, content_hash = resp.headers["ETag"], resp.json()["content_hash"]
+    if method == "POST":
+        body = {**body, "email_ids": [str(email_id)]}
+    resp = client.request(method, path.format(email_id=email_id), json=body)
+    assert resp.status_code == 200
+    resp = client.get(f"/contact/email/{email_id}", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+    assert resp.json()["content_hash"] != content_hash
+
+
+@pytest.mark.parametrize("subgroup", ("amo", "vpn_waitlist", "fxa"))
+def test_get_subgroup_missing(client, minimal_contact, subgroup):
+    """GET /contact/{subgroup}/{email_id} returns defaults without a row."""
+    email_id = minimal_contact.email.email_id
+    resp = client.get(f"/contact/{subgroup}/{email_id}")
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] == '"0"'
+
+
 @pytest.mark.parametrize("subgroup", ("email", "amo", "vpn_waitlist", "fxa"))
 def test_get_subgroup_not_found(client, dbsession, subgroup):
     """GET /contact/{subgroup}/{unknown email_id} returns a 404."""
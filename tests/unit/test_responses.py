@@ -0,0 +1,57 @@
+"""pytest tests for the JSON response encoding"""
+from datetime import date, datetime, timedelta, timezone
+from uuid import UUID
+
+import pytest
+
+from ctms.responses import dump_json
+from ctms.sample_data import SAMPLE_CONTACTS
+
+
+def test_dump_json_types():
+    """UUIDs, dates and datetimes are encoded like pydantic."""
+    data = {
+        "email_id": UUID("67e52c77-950f-4f28-accb-bb3ea1a2c51a"),
+        "create_timestamp": datetime(2020, 3, 28, 15, 41, tzinfo=timezone.utc),
+        "update_timestamp": datetime(
+            2021, 3, 4, 12, 30, 45, 123000, tzinfo=timezone(timedelta(hours=-5))
+        ),
+        "last_login": date(2021, 1, 28),
+        "first_name": "Zoë",
+        "mofo_relevant": False,
+        "sfdc_id": None,
+    }
+    assert dump_json(data) == (
+        b'{"email_id":"67e52c77-950f-4f28-accb-bb3ea1a2c51a",'
+        b'"create_timestamp":"2020-03-28T15:41:00+00:00",'
+        b'"update_timestamp":"2021-03-04T12:30:45.123000-05:00",'
+        b'"last_login":"2021-01-28",'
+        b'"first_name":"Zo\xc3\xab",'
+        b'"mofo_relevant":false,'
+        b'"sfdc_id":null}'
+    )
+
+
+@pytest.mark.parametrize(
+    "email_id",
+    (
+        "93db83d4-4119-4e0c-af87-a713786fa81d",
+        "67e52c77-950f-4f28-accb-bb3ea1a2c51a",
+        "332de237-cab7-4461-bcc3-48e68f42bd5c",
+    ),
+)
+def test_dump_json_contact(email_id):
+    """A contact is encoded the same as by pydantic."""
+    contact = SAMPLE_CONTACTS[UUID(email_id)]
+    expected = contact.json(separators=(",", ":"), ensure_ascii=False)
+    assert dump_json(contact.dict()) == expected.encode("utf8")
+
+
+def test_batch_get_ctms_json(client, sample_contacts):
+    """The batch response is JSON, in the order requested."""
+    email_ids = [str(email_id) for email_id, _ in sample_contacts.values()]
+    resp = client.post("/ctms/batch", json={"email_ids": email_ids})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/json"
+    data = resp.json()
+    assert [c["email"]["email_id"] for c in data["contacts"]] == email_ids